@@ -0,0 +1,93 @@
+"""
+Cost of Item construction and of Market.get_price calls on already resolved prices,
+against the previous WeakValueDictionary Item that re-ran __init__ on every call.
+
+Run from the repository root:
+    python -m benchmarks.bench_item --calls 1000000
+"""
+import argparse
+import random
+import time
+import weakref
+
+import numpy as np
+
+import item as item_module
+from game_data import GAME_DATA
+from item import E2C, ITEM_INDEX, Item
+from market import Market
+
+
+class LegacyItem:
+    """
+    The original Item, kept as the reference.
+    """
+    _pool = weakref.WeakValueDictionary()
+
+    def __new__(cls, item_hrid, enhance_level=0, *args, **kwargs):
+        assert enhance_level in range(0, item_module.ENHANCE_LEVELS)
+        if (item_hrid, enhance_level) in cls._pool:
+            return cls._pool[(item_hrid, enhance_level)]
+        else:
+            obj = super().__new__(cls)
+            cls._pool[(item_hrid, enhance_level)] = obj
+            return obj
+
+    def __init__(self, item_hrid, enhance_level=0):
+        self.item_hrid = item_hrid
+        self.enhance_level = enhance_level
+        self.index = ITEM_INDEX[item_hrid]
+        self.item_detail = GAME_DATA.client_data["itemDetailMap"][item_hrid]
+        self.name_en = f"{self.item_detail['name']}+{self.enhance_level}"
+        self.name_zh = f"{E2C.get(self.item_hrid, self.name_en)}+{self.enhance_level}"
+
+
+def synthetic_market(seed=0):
+    """
+    Offline Market over random prices for every item at +0, so nothing is fetched.
+    """
+    rng = np.random.default_rng(seed)
+    size = len(item_module.ITEM_HRIDS) * item_module.ENHANCE_LEVELS
+    market_prices = {mode: np.full(size, -1, dtype=np.int64) for mode in ('a', 'b')}
+    market_prices['b'][::item_module.ENHANCE_LEVELS] = rng.integers(1, 1_000_000, len(item_module.ITEM_HRIDS))
+    market_prices['a'][::item_module.ENHANCE_LEVELS] = market_prices['b'][::item_module.ENHANCE_LEVELS] * 11 // 10
+    market = Market(enhance_item_mode='none', url=None, snapshot_path=None)
+    market.verbose = False
+    market.load_market_prices(market_prices, 0)
+    market.last_update_time = time.time()
+    return market
+
+
+def timed(function, keys):
+    start = time.perf_counter()
+    for key in keys:
+        function(*key)
+    return (time.perf_counter() - start) / len(keys) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    keys = [(rng.choice(item_module.ITEM_HRIDS), rng.randrange(item_module.ENHANCE_LEVELS)) for _ in range(args.calls)]
+    # keep the legacy items alive, like the price graph does, so the weak pool hits
+    legacy = [LegacyItem(*key) for key in set(keys)]
+    item_module.catalog()
+
+    print(f'{"operation":>28} {"ns/call":>9}')
+    print(f'{"LegacyItem(hrid, level)":>28} {timed(LegacyItem, keys):>9.0f}')
+    print(f'{"Item(hrid, level)":>28} {timed(Item, keys):>9.0f}')
+    print(f'{"item.from_node(node)":>28} {timed(item_module.from_node, [(ITEM_INDEX[h] * item_module.ENHANCE_LEVELS + l,) for h, l in keys]):>9.0f}')
+
+    market = synthetic_market()
+    market.price_vector('a')
+    items = [(Item(*key), 'a') for key in keys]
+    print(f'{"market.get_price(item, mode)":>28} {timed(market.get_price, items):>9.0f}')
+    print(f'{"get_price(Item(...), mode)":>28} {timed(lambda h, l: market.get_price(Item(h, l), "a"), keys):>9.0f}')
+    del legacy
+
+
+if __name__ == '__main__':
+    main()
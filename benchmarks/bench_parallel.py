@@ -0,0 +1,104 @@
+"""
+Scaling of parallel.ValuationPool over worker counts, for networth and cost_cdf jobs.
+Prices and players are synthetic, so no network access is needed.
+
+Run from the repository root:
+    python -m benchmarks.bench_parallel --processes 1 2 4 8
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import item as item_module
+import tools
+from game_data import GAME_DATA
+from parallel import ValuationPool
+
+
+class SyntheticPrices:
+    def __init__(self, seed=0):
+        rng = np.random.default_rng(seed)
+        shape = (len(item_module.ITEM_HRIDS), item_module.ENHANCE_LEVELS)
+        self.vectors = {'b': rng.integers(1, 1_000_000, shape)}
+        self.vectors['a'] = self.vectors['b'] * 11 // 10
+
+    def price_vector(self, mode, force_refresh=False, auto_refresh_time=600):
+        return self.vectors[mode]
+
+
+def synthetic_players(count, inventory_size, seed=0):
+    rng = random.Random(seed)
+    enhanceable = [item_hrid for item_hrid in GAME_DATA.item_hrids if GAME_DATA.client_data['itemDetailMap'][item_hrid].get('enhancementCosts')]
+    abilities = list(GAME_DATA.ability_books)
+    houses = list(GAME_DATA.house_costs)
+    players = []
+    for _ in range(count):
+        players.append({
+            'characterAbilities': [{'abilityHrid': ability_hrid, 'experience': rng.uniform(0, 1e6)}
+                                   for ability_hrid in rng.sample(abilities, min(len(abilities), inventory_size // 10))],
+            'characterItems': [{'itemHrid': rng.choice(GAME_DATA.item_hrids), 'enhancementLevel': 0, 'count': rng.randint(1, 10_000)}
+                               for _ in range(inventory_size)] +
+                              [{'itemHrid': rng.choice(enhanceable), 'enhancementLevel': rng.randint(1, 20), 'count': 1}
+                               for _ in range(inventory_size // 10)],
+            'myMarketListings': [{'isSell': rng.random() < 0.5, 'itemHrid': rng.choice(GAME_DATA.item_hrids), 'enhancementLevel': 0,
+                                  'orderQuantity': 100, 'filledQuantity': rng.randint(0, 100), 'price': rng.randint(1, 100_000)}
+                                 for _ in range(inventory_size // 20)],
+            'characterHouseRoomMap': {house_hrid: {'level': rng.randint(0, 8)} for house_hrid in rng.sample(houses, 5)},
+        })
+    return players
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--players', type=int, default=20_000)
+    parser.add_argument('--inventory-size', type=int, default=200)
+    parser.add_argument('--cdf-jobs', type=int, default=32)
+    args = parser.parse_args()
+
+    prices = SyntheticPrices()
+    players = synthetic_players(args.players, args.inventory_size)
+    cdf_jobs = [((12 + i % 8, 8, 0.0129, 0.1, 1, 100), 20_000, {'method': 'CF'}) for i in range(args.cdf_jobs)]
+
+    start = time.perf_counter()
+    serial = tools.networth_batch(prices, players)
+    serial_time = time.perf_counter() - start
+    print(f'serial networth_batch: {serial_time:.3f}s for {len(players)} players')
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for index, player in enumerate(players):
+            paths.append(os.path.join(directory, f'{index}.json'))
+            with open(paths[-1], 'w', encoding='utf-8') as f:
+                json.dump(player, f)
+
+        print(f'{"processes":>9} {"networth s":>11} {"speedup":>8} {"files s":>8} {"speedup":>8} {"cost_cdf s":>11} {"speedup":>8}')
+        baseline = None
+        for processes in args.processes:
+            with ValuationPool(prices, processes) as pool:
+                start = time.perf_counter()
+                result = pool.networth(players)
+                networth_time = time.perf_counter() - start
+                start = time.perf_counter()
+                files_result = pool.networth_files(paths)
+                files_time = time.perf_counter() - start
+                start = time.perf_counter()
+                pool.cost_cdfs(cdf_jobs)
+                cdf_time = time.perf_counter() - start
+            for category in tools.NETWORTH_CATEGORIES:
+                for mode in ('a', 'b'):
+                    assert np.array_equal(result[category][mode], serial[category][mode])
+                    assert np.array_equal(files_result[category][mode], serial[category][mode])
+            if baseline is None:
+                baseline = (networth_time, files_time, cdf_time)
+            print(f'{processes:>9} {networth_time:>11.3f} {baseline[0] / networth_time:>8.2f} '
+                  f'{files_time:>8.3f} {baseline[1] / files_time:>8.2f} {cdf_time:>11.3f} {baseline[2] / cdf_time:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Quantiles of the enhancing cost from simulate.MonteCarlo against the exact enhance.Action.cost_cdf.
+
+Run from the repository root:
+    python -m benchmarks.bench_simulate --targets 8 10 12 --protect-level 5 --chains 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+import enhance
+import simulate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', type=int, nargs='+', default=[8, 10, 12])
+    parser.add_argument('--protect-level', type=int, default=5)
+    parser.add_argument('--enhance-cost', type=int, default=1)
+    parser.add_argument('--protect-cost', type=int, default=100)
+    parser.add_argument('--chains', type=int, default=1_000_000)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--block-steps', type=int, default=128)
+    parser.add_argument('--quantiles', type=float, nargs='+', default=[0.5, 0.9, 0.95, 0.99])
+    parser.add_argument('--method', default='CF')
+    args = parser.parse_args()
+
+    print(f'{"action":>12} {"q":>5} {"exact":>10} {"simulated":>10} {"95% interval":>23} {"cdf s":>8} {"mc s":>8}')
+    for target_level in args.targets:
+        act = enhance.Action(target_level, args.protect_level, 0.0129, 0.1, args.enhance_cost, args.protect_cost)
+        processes = args.processes or 1
+        mc = simulate.MonteCarlo(act, seed=0, batch_size=-(-args.chains // processes), processes=args.processes,
+                                 block_steps=args.block_steps)
+        start = time.perf_counter()
+        mc.run(processes)
+        quantiles = {q: mc.quantile(q) for q in args.quantiles}
+        mc_time = time.perf_counter() - start
+
+        # the exact CDF has to reach past the largest quantile, size it from the simulated one
+        steps = int(max(high for _, _, high in quantiles.values()) * 1.2 / act.enhance_cost) + 1
+        start = time.perf_counter()
+        xs, ys = act.cost_cdf(steps, method=args.method)
+        cdf_time = time.perf_counter() - start
+        for q, (estimate, low, high) in quantiles.items():
+            exact = xs[min(np.searchsorted(ys, q), len(xs) - 1)]
+            print(f'{str(act):>12} {q:>5} {exact:>10.0f} {estimate:>10.0f} {f"[{low:.0f}, {high:.0f}]":>23} '
+                  f'{cdf_time:>8.3f} {mc_time:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the vectorized 'DP' method of enhance.Action.cost_cdf against the original pure-Python loop.
+
+Run from the repository root:
+    python -m benchmarks.cost_cdf --steps 200
+"""
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+
+import enhance
+
+
+def legacy_dp_cost_cdf(act, steps, tol=1e-10):
+    """
+    The original 'DP' implementation of Action.cost_cdf, kept as the reference.
+    """
+    a = act.enhance_cost
+    b = act.enhance_cost + act.protect_cost
+    distribution = defaultdict(float)
+    f = np.zeros((steps + 1, act.target_level + 1))
+    f[0][act.target_level] = 1.0
+    for step in range(1, steps + 1):
+        for k1 in reversed(range(step + 1)):
+            f[k1] = [
+                sum(
+                    act.P[i][j] * (
+                        f[k1 - 1][j] if (act.H[i][j] == a and k1 > 0) else (f[k1][j] if (act.H[i][j] == b and k1 < step) else 0.0)
+                    )
+                    for j in range(act.target_level + 1)
+                )
+                for i in range(act.target_level + 1)
+            ]
+            if f[k1][0]:
+                distribution[k1 * a + (step - k1) * b] += f[k1, 0]
+            if k1 + 1 < steps and sum(f[k1]) < sum(f[k1 + 1]) and sum(f[k1]) <= tol:
+                f[k1] = [0.0 for _ in range(act.target_level + 1)]
+                break
+            if not any(f[k1]):
+                break
+    xs = np.array([0.0] + sorted(filter(lambda i: i < (steps + 1) * a, distribution.keys())))
+    ys = np.zeros(len(xs))
+    for i, x in enumerate(xs):
+        ys[i] = distribution[x] + (ys[i - 1] if i > 0 else 0.0)
+    return xs, ys
+
+
+def max_cdf_error(reference, result):
+    """
+    Largest absolute difference between two step CDFs, evaluated on the union of their support.
+    """
+    xs = np.union1d(reference[0], result[0])
+    ref = reference[1][np.searchsorted(reference[0], xs, side='right') - 1]
+    res = result[1][np.searchsorted(result[0], xs, side='right') - 1]
+    return float(np.max(np.abs(ref - res)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--protect-level', type=int, default=8)
+    parser.add_argument('--enhance-cost', type=int, default=1)
+    parser.add_argument('--protect-cost', type=int, default=100)
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    print(f'{"action":>12} {"legacy s":>10} {"vector s":>10} {"speedup":>8} {"max |dF|":>10}')
+    for target_level in range(5, 21):
+        act = enhance.Action(target_level, args.protect_level, 0.0129, 0.1, args.enhance_cost, args.protect_cost)
+        start = time.perf_counter()
+        result = act.cost_cdf(args.steps, method='DP')
+        vector_time = time.perf_counter() - start
+        if args.skip_legacy:
+            print(f'{str(act):>12} {"-":>10} {vector_time:>10.4f} {"-":>8} {"-":>10}')
+            continue
+        start = time.perf_counter()
+        reference = legacy_dp_cost_cdf(act, args.steps)
+        legacy_time = time.perf_counter() - start
+        print(f'{str(act):>12} {legacy_time:>10.4f} {vector_time:>10.4f} {legacy_time / vector_time:>8.1f} '
+              f'{max_cdf_error(reference, result):>10.2e}')
+
+
+if __name__ == '__main__':
+    main()
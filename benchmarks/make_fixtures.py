@@ -0,0 +1,81 @@
+"""
+Regenerate the checked-in benchmark fixtures in benchmarks/fixtures. Output is deterministic for a given
+init_client_data.json, so the fixtures only change when the game data does.
+
+Run from the repository root:
+    python -m benchmarks.make_fixtures
+"""
+import json
+import os
+import random
+
+from benchmarks.bench_parallel import synthetic_players
+from game_data import GAME_DATA
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+MARKET_FIXTURE = os.path.join(FIXTURES, 'market.json')
+ORDER_BOOK_FIXTURE = os.path.join(FIXTURES, 'order_books.json')
+INVENTORY_SIZES = (10, 100, 1_000, 10_000)
+MARKET_TIMESTAMP = 1_750_000_000
+
+
+def player_fixture(inventory_size):
+    return os.path.join(FIXTURES, f'player_{inventory_size}.json')
+
+
+def synthetic_market_data(seed=7):
+    """
+    Marketplace payload shaped like MOOKET_MARKET_API : every tradable item at +0 around a few times its sellPrice,
+    5% without an ask, and about 30% of the enhance levels of equipment listed.
+    """
+    rng = random.Random(seed)
+    market_data = {}
+    for item_hrid, item_detail in GAME_DATA.client_data['itemDetailMap'].items():
+        if not item_detail.get('isTradable') or item_hrid == '/items/coin':
+            continue
+        base = max(item_detail.get('sellPrice', 1), 1) * rng.uniform(2, 8)
+        levels = {'0': {'a': -1 if rng.random() < 0.05 else int(base * 1.05), 'b': int(base * 0.95)}}
+        if item_detail.get('enhancementCosts'):
+            for enhance_level in range(1, 21):
+                if rng.random() < 0.3:
+                    levels[str(enhance_level)] = {'a': int(base * 1.5 ** enhance_level), 'b': int(base * 1.4 ** enhance_level)}
+        market_data[item_hrid] = levels
+    return {'marketData': market_data, 'timestamp': MARKET_TIMESTAMP}
+
+
+def synthetic_order_books(market_data, seed=11):
+    """
+    Order book snapshot (order_book.py format) around the fixture marketplace : each listed price opens a book of up to
+    10 levels per side, prices moving away from the top by 1-5% a level.
+    """
+    rng = random.Random(seed)
+    order_books = {}
+    for item_hrid, levels in market_data['marketData'].items():
+        books = [None] * (max(map(int, levels)) + 1)
+        for enhance_level, prices in levels.items():
+            book = {'asks': [], 'bids': []}
+            for side, key, direction in (('asks', 'a', 1), ('bids', 'b', -1)):
+                price = prices[key]
+                for _ in range(rng.randint(1, 10) if price > 0 else 0):
+                    book[side].append({'price': price, 'quantity': rng.randint(1, 2_000)})
+                    price = max(int(price * (1 + direction * rng.uniform(0.01, 0.05))), 1)
+            books[int(enhance_level)] = book
+        order_books[item_hrid] = books
+    return {'orderBooks': order_books, 'timestamp': market_data['timestamp']}
+
+
+def main():
+    os.makedirs(FIXTURES, exist_ok=True)
+    market_data = synthetic_market_data()
+    with open(MARKET_FIXTURE, 'w', encoding='utf-8') as f:
+        json.dump(market_data, f, separators=(',', ':'))
+    with open(ORDER_BOOK_FIXTURE, 'w', encoding='utf-8') as f:
+        json.dump(synthetic_order_books(market_data), f, separators=(',', ':'))
+    for inventory_size in INVENTORY_SIZES:
+        player, = synthetic_players(1, inventory_size, seed=inventory_size)
+        with open(player_fixture(inventory_size), 'w', encoding='utf-8') as f:
+            json.dump(player, f, separators=(',', ':'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Timings and peak memory of the market, enhance and tools hot paths over the checked-in fixtures, no network needed.
+
+Every benchmark is timed cold (fresh Market, price graph and caches) and warm (the same call again), then run once
+more under tracemalloc for its peak allocation. Results are written as JSON and can be compared to a previous run:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --output new.json --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import enhance
+import item as item_module
+import tools
+from benchmarks.make_fixtures import INVENTORY_SIZES, MARKET_FIXTURE, ORDER_BOOK_FIXTURE, player_fixture
+from game_data import GAME_DATA
+from item import Item
+from market import Market
+from order_book import OrderBooks
+
+ENHANCEABLE = [item_hrid for item_hrid in GAME_DATA.item_hrids if GAME_DATA.client_data['itemDetailMap'][item_hrid].get('enhancementCosts')]
+COST_CDF_METHODS = ('DP', 'CF', 'CFnum')
+
+
+def fixture_market(enhance_item_mode='fallback'):
+    """
+    Offline Market over the fixture marketplace. Also empties the process-wide expectation_table cache,
+    so cold runs do not depend on which benchmarks ran before them.
+    """
+    enhance.expectation_table.cache_clear()
+    with open(MARKET_FIXTURE, encoding='utf-8') as f:
+        data = json.load(f)
+    market = Market(enhance_item_mode=enhance_item_mode, url=None, snapshot_path=None)
+    market.verbose = False
+    market.load_market_data(data)
+    market.last_update_time = time.time()
+    return market
+
+
+def catalog_prices(market):
+    for it in item_module.catalog()[::item_module.ENHANCE_LEVELS]:
+        market.get_price(it, 'a')
+        market.get_price(it, 'b')
+
+
+def enhanced_prices(market):
+    for item_hrid in ENHANCEABLE:
+        for enhance_level in range(1, item_module.ENHANCE_LEVELS):
+            market.get_enhanced_price(Item(item_hrid, enhance_level), 'b')
+
+
+def cost_cdf_case(method, steps):
+    def setup():
+        return enhance.Action(10, 5, 0.0129, 0.1, 1, 100)
+
+    def run(act):
+        act.cost_cdf(steps, method=method)
+
+    return setup, run
+
+
+def networth_case(inventory_size, liquidation=False):
+    with open(player_fixture(inventory_size), encoding='utf-8') as f:
+        player = json.load(f)
+    order_books = OrderBooks.load(ORDER_BOOK_FIXTURE) if liquidation else None
+
+    def run(market):
+        tools.get_player_networth(market, player, order_books=order_books)
+
+    return fixture_market, run
+
+
+def benchmarks(args):
+    """
+    name -> (setup, run) : setup() builds fresh state for a cold run, run(state) is timed, a warm run reuses state.
+    """
+    cases = {
+        'get_price_catalog': (fixture_market, catalog_prices),
+        'get_enhanced_price_all_levels': (lambda: fixture_market('none'), enhanced_prices),
+    }
+    for method in args.cdf_methods:
+        cases[f'cost_cdf_{method}'] = cost_cdf_case(method, args.cdf_steps)
+    for inventory_size in INVENTORY_SIZES:
+        cases[f'networth_{inventory_size}'] = networth_case(inventory_size)
+        cases[f'networth_liquidation_{inventory_size}'] = networth_case(inventory_size, liquidation=True)
+    return cases
+
+
+def measure(setup, run, repeat):
+    cold, warm = [], []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        run(state)
+        warm.append(time.perf_counter() - start)
+    state = setup()
+    tracemalloc.start()
+    try:
+        run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    summary = lambda times: {'min': min(times), 'median': statistics.median(times), 'runs': len(times)}
+    return {'cold': summary(cold), 'warm': summary(warm), 'peak_bytes': peak}
+
+
+def compare(results, previous, threshold):
+    """
+    Print the ratio to a previous run for every shared benchmark, return the names slower than threshold.
+    """
+    regressions = []
+    print(f'{"benchmark":>32} {"cold x":>8} {"warm x":>8} {"peak x":>8}')
+    for name, result in results['results'].items():
+        if name not in previous['results']:
+            continue
+        before = previous['results'][name]
+        ratios = [result[run]['min'] / before[run]['min'] if before[run]['min'] else float('inf') for run in ('cold', 'warm')]
+        peak = result['peak_bytes'] / before['peak_bytes'] if before['peak_bytes'] else float('inf')
+        flag = ' regression' if max(ratios) > threshold else ''
+        print(f'{name:>32} {ratios[0]:>8.2f} {ratios[1]:>8.2f} {peak:>8.2f}{flag}')
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cdf-steps', type=int, default=2000)
+    # CFsym needs sympy and takes tens of seconds, so it only runs when asked for
+    parser.add_argument('--cdf-methods', nargs='+', default=list(COST_CDF_METHODS), choices=('DP', 'CF', 'CFnum', 'CFsym'))
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help='results JSON of a previous run')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {'time': time.time(), 'python': sys.version.split()[0], 'numpy': np.__version__, 'platform': platform.platform(),
+                 'processor': platform.processor(), 'cpu_count': os.cpu_count(), 'game_version': GAME_DATA.game_version,
+                 'repeat': args.repeat},
+        'results': {},
+    }
+    print(f'{"benchmark":>32} {"cold s":>10} {"warm s":>10} {"peak MB":>9}')
+    for name, (setup, run) in benchmarks(args).items():
+        if args.filter not in name:
+            continue
+        result = measure(setup, run, args.repeat)
+        results['results'][name] = result
+        print(f'{name:>32} {result["cold"]["min"]:>10.4f} {result["warm"]["min"]:>10.4f} {result["peak_bytes"] / 2 ** 20:>9.2f}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        if compare(results, previous, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
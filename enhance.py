@@ -1,9 +1,55 @@
+import functools
 import time
-from collections import defaultdict
-import sympy as sp
+from collections import namedtuple
 import numpy as np
 np.set_printoptions(suppress=True,linewidth=1000000)
 
+MAX_LEVEL = 20
+
+ExpectationTable = namedtuple('ExpectationTable', ['steps', 'protects', 'exp'])
+
+
+class BonusProfile:
+    """
+    A player's enhancing bonuses. For an item of itemLevel L
+        bonus_rate = tool_rate + (level - L) * 0.0005 + sum(rate_bonuses)
+        bonus_speed = tool_speed + (level - L) * 0.01 + sum(speed_bonuses)
+        step_time = base_time / (1 + bonus_speed) seconds, each second costing time_value coins
+    The bonuses are added in this order so the defaults give bit-identical prices to the old hard-coded formulas.
+    """
+
+    def __init__(self, level=135.32, bless=0.0129, tool_rate=0.05418, rate_bonuses=(0.003,),
+                 tool_speed=0.129 + 0.0532, speed_bonuses=(0.06, 0.295, 0.06774), base_time=12, time_value=10_000_000 / 3600):
+        self.level = level
+        self.bless = bless
+        self.tool_rate = tool_rate
+        self.rate_bonuses = tuple(rate_bonuses)
+        self.tool_speed = tool_speed
+        self.speed_bonuses = tuple(speed_bonuses)
+        self.base_time = base_time
+        self.time_value = time_value
+
+    def bonus_rate(self, item_level):
+        bonus_rate = self.tool_rate + (self.level - item_level) * 0.0005
+        for bonus in self.rate_bonuses:
+            bonus_rate += bonus
+        return bonus_rate
+
+    def bonus_speed(self, item_level):
+        bonus_speed = self.tool_speed + (self.level - item_level) * 0.01
+        for bonus in self.speed_bonuses:
+            bonus_speed += bonus
+        return bonus_speed
+
+    def step_time(self, item_level):
+        return self.base_time / (1 + self.bonus_speed(item_level))
+
+    def expectation_table(self, item_level):
+        return expectation_table(self.bless, self.bonus_rate(item_level))
+
+
+DEFAULT_PROFILE = BonusProfile()
+
 class Action:
     S = [0.50, 0.45, 0.45, 0.40, 0.40, 0.40, 0.35, 0.35, 0.35, 0.35,
          0.30, 0.30, 0.30, 0.30, 0.30, 0.30, 0.30, 0.30, 0.30, 0.30, ]
@@ -52,6 +98,7 @@ class Action:
         self.Q = self.P[:-1, :-1]
         self.R = self.P[:-1, -1]
         self.N = np.linalg.inv(np.eye(target_level) - self.Q)
+        self.lattice_pmf_cache = {}
 
     def __str__(self, lean=True):
         if lean:
@@ -84,58 +131,196 @@ class Action:
         u0[0] = 1.0
         return u0 @ self.N @ (self.P[:-1, :] * self.H_exp[:-1, :]) @ np.ones(self.target_level + 1)
 
-    def cost_cdf(self, steps, tol=1e-10, method='DP', compute_phi_method='CRAMER', debug=False):
+    def tail_steps(self, tol):
+        """
+        Smallest number of attempts t such that P(more than t attempts to reach the target) <= tol.
+        """
+        u0 = np.zeros(self.target_level)
+        u0[0] = 1.0
+        powers = [self.Q]
+        while (u0 @ powers[-1]).sum() > tol and len(powers) < 63:
+            powers.append(powers[-1] @ powers[-1])
+        t = 0
+        v = u0
+        for k in reversed(range(len(powers))):
+            w = v @ powers[k]
+            if w.sum() > tol:
+                v = w
+                t += 2 ** k
+        return t + 1
+
+    def lattice_costs(self, resolution=None):
+        """
+        Attempt costs H as integer multiples of a lattice width.
+        resolution=None uses the gcd of the (integer) costs, which is exact,
+        a coarser resolution rounds every cost to the nearest multiple of it.
+        """
+        if resolution is None:
+            if not np.allclose(self.H, np.round(self.H)):
+                raise ValueError('CF methods need integer costs, pass resolution to round them')
+            resolution = max(int(np.gcd.reduce(np.round(self.H).astype(np.int64).ravel())), 1)
+        return np.round(self.H / resolution).astype(np.int64), resolution
+
+    def phi_recurrence(self, entry):
+        """
+        phi_0 of the generating function by backward substitution along the chain, for a whole chunk of frequencies.
+        entry(i, j) gives P[i, j] * z ** H[i, j] for the chunk.
+
+        Level i only moves up (to i + 1, i + 2 or the target), to itself, or down to low(i): i - 1 when protected,
+        0 otherwise. Going from the top, every phi_i is kept as e_i + f_i * phi_low(i), which turns the dense
+        solve into O(n^2) vector operations per chunk.
+        """
+        n = self.target_level
+        low = [i - 1 if self.enable_protect and i >= self.protect_level else 0 for i in range(n)]
+        e = [0] * n
+        f = [0] * n
+        for i in reversed(range(n)):
+            const = entry(i, n) if self.P[i, n] else 0
+            coef_i = entry(i, i) if self.P[i, i] else 0
+            coef_low = 0
+            # phi_j for j > i as alpha + beta * phi_i + gamma * phi_0
+            expansions = {}
+            for j in range(i + 1, n):
+                if low[j] == i:
+                    alpha, beta, gamma = 0, 1, 0
+                elif low[j] == 0:
+                    alpha, beta, gamma = 0, 0, 1
+                else:
+                    alpha, beta, gamma = expansions[low[j]]
+                expansions[j] = (e[j] + f[j] * alpha, f[j] * beta, f[j] * gamma)
+                if self.P[i, j]:
+                    a = entry(i, j)
+                    const = const + a * expansions[j][0]
+                    coef_i = coef_i + a * expansions[j][1]
+                    coef_low = coef_low + a * expansions[j][2]
+            if i == 0:
+                return const / (1 - coef_i - coef_low)
+            if low[i] != 0:
+                # a protected level only leads to protected levels above it, so there is no phi_0 term
+                coef_low = 0
+            if self.P[i, low[i]]:
+                coef_low = coef_low + entry(i, low[i])
+            e[i] = const / (1 - coef_i)
+            f[i] = coef_low / (1 - coef_i)
+
+    def lattice_pmf(self, units, tol, chunk_size=4096, max_units=None, debug_print=None, solver='dense'):
+        """
+        Probability mass function of the total cost in lattice units, from the generating function
+        E[z^C] = phi_0(z) with (I - A(z)) phi(z) = b(z), sampled on a circle and inverted by one real FFT.
+
+        The FFT length covers the whole cost distribution up to a tail mass of tol. When that is longer than needed
+        for max_units, the circle is shrunk to radius r with r^N = tol instead (Abate-Whitt damping), so the
+        aliased tail is suppressed without sampling it. Frequencies are solved chunk_size at a time to bound memory,
+        either by a batched dense solve (solver='dense') or by phi_recurrence (solver='recurrence').
+        Results are cached per lattice, so costs that only differ by a common factor reuse the same samples.
+        """
+        if debug_print is None:
+            debug_print = lambda *args: None
+        tail_units = self.tail_steps(tol) * int(units.max()) + 1
+        if max_units is None or tail_units <= 2 * max_units:
+            samples_N = 2 ** int(np.ceil(np.log2(max(tail_units, 2))))
+            radius = 1.0
+        else:
+            samples_N = 2 * 2 ** int(np.ceil(np.log2(max_units + 1)))
+            radius = tol ** (1 / samples_N)
+        # radius tells a damped pmf, cut to samples_N // 2, from an undamped one of the same length
+        key = (units.tobytes(), tol, samples_N, radius, solver)
+        if key in self.lattice_pmf_cache:
+            return self.lattice_pmf_cache[key]
+        debug_print('samples N =', samples_N, 'radius =', radius)
+        half = samples_N // 2 + 1
+        phi_samples = np.empty(half, dtype=complex)
+        I = np.eye(self.target_level)
+        for start in range(0, half, chunk_size):
+            t = 2 * np.pi * np.arange(start, min(start + chunk_size, half)) / samples_N
+            if solver == 'recurrence':
+                powers = {u: np.exp(1j * t * u) * radius ** u for u in np.unique(units[self.P > 0])}
+                phi_samples[start:start + len(t)] = self.phi_recurrence(lambda i, j: self.P[i, j] * powers[units[i, j]])
+            else:
+                z = np.exp(1j * t[:, None, None] * units) * radius ** units
+                A = self.P[:-1, :-1] * z[:, :-1, :-1]
+                b = (self.P[:-1, -1] * z[:, :-1, -1])[..., np.newaxis]
+                phi_samples[start:start + len(t)] = np.linalg.solve(I - A, b)[:, 0, 0]
+        debug_print('compute IFFT')
+        pmf = np.fft.irfft(np.conj(phi_samples), n=samples_N)
+        if radius < 1.0:
+            pmf *= radius ** -np.arange(samples_N, dtype=float)
+            pmf = pmf[:samples_N // 2]
+        pmf[pmf <= tol] = 0
+        if radius == 1.0:
+            total_prob = np.sum(pmf)
+            debug_print('total probability:', total_prob)
+            if total_prob <= 0:
+                raise ValueError('Failed: Negative Probability')
+            pmf /= total_prob
+        self.lattice_pmf_cache[key] = pmf
+        return pmf
+
+    def cost_cdf(self, steps, tol=1e-10, method='DP', compute_phi_method='CRAMER', debug=False, resolution=None, chunk_size=4096):
         """
         method : "DP" = Dynamic Programming
-                 "CF" = Characteristic Function
+                 "CF" = Characteristic Function, solved by recurrence along the chain
+                 "CFnum" = Characteristic Function, solved by a batched dense solve
+                 "CFsym" = Characteristic Function, solved symbolically (needs sympy)
+        resolution, chunk_size : cost lattice width and frequencies per solve for "CF" and "CFnum", see lattice_pmf
         """
 
         def debug_print(*args, **kwargs):
             if debug:
                 print(method + (compute_phi_method if method == 'CFsym' else ''), str(self), f'{time.time():.3f}', *args, **kwargs)
 
-        if method not in ('DP', 'CFsym','CFnum'):
-            raise ValueError('method must be DP or CFsym or CFnum')
+        if method not in ('DP', 'CF', 'CFsym', 'CFnum'):
+            raise ValueError('method must be DP or CF or CFsym or CFnum')
         if method == 'DP':
             debug_print('initialize')
             a = self.enhance_cost
             b = self.enhance_cost + self.protect_cost
-            distribution = defaultdict(float)
-            f = np.zeros((steps + 1, self.target_level + 1))
-            f[0][self.target_level] = 1.0
+            # split transitions by their cost, a transition costing a moves to the next k1 row
+            Pa = np.where(self.H == a, self.P, 0.0).T
+            Pb = np.where((self.H == b) & (self.H != a), self.P, 0.0).T
+            # f[k1 - lo, i]: probability to reach the target from level i in exactly `step` attempts, k1 of them costing a
+            f = np.zeros((1, self.target_level + 1))
+            f[0, self.target_level] = 1.0
+            lo = 0
+            costs = []
+            probs = []
             debug_print("start")
             progress = 0
-            total_prob = 0.0
             for step in range(1, steps + 1):  # step = k1+k2
-                for k1 in reversed(range(step + 1)):  # k1
-                    f[k1] = [
-                        sum(
-                            self.P[i][j] * (
-                                f[k1 - 1][j] if (self.H[i][j] == a and k1 > 0) else (f[k1][j] if (self.H[i][j] == b and k1 < step) else 0.0)
-                            )
-                            for j in range(self.target_level + 1)
-                        )
-                        for i in range(self.target_level + 1)
-                    ]
-                    if f[k1][0]:
-                        distribution[k1 * a + (step - k1) * b] += f[k1, 0]
-                    if k1 + 1 < steps and sum(f[k1]) < sum(f[k1 + 1]) and sum(f[k1]) <= tol:
-                        f[k1] = [0.0 for _ in range(self.target_level + 1)]
-                        break
-                    if not any(f[k1]):
-                        break
+                g = np.zeros((f.shape[0] + 1, self.target_level + 1))
+                g[1:] += f @ Pa
+                g[:-1] += f @ Pb
+                absorbed = np.flatnonzero(g[:, 0])
+                if absorbed.size:
+                    k1 = lo + absorbed
+                    costs.append(k1 * a + (step - k1) * b)
+                    probs.append(g[absorbed, 0])
+                mass = g.sum(axis=1)
+                kept = np.flatnonzero(mass > tol)
+                if not kept.size:
+                    break
+                f = g[kept[0]:kept[-1] + 1]
+                lo += kept[0]
                 if step / steps >= progress / 100:
-                    debug_print(f'progress: {step / steps * 100:.0f}%')
+                    debug_print(f'progress: {step / steps * 100:.0f}%, rows: {f.shape[0]}')
                     progress += 10
-                total_prob += np.sum(f[:, 0])
-            debug_print("total probability:", total_prob)
-            xs = np.array([0.0] + sorted(filter(lambda i: i < (steps + 1) * a, distribution.keys())))
-            ys = np.zeros(len(xs))
-            for i, x in enumerate(xs):
-                ys[i] = distribution[x] + (ys[i - 1] if i > 0 else 0.0)
+            costs = np.concatenate(costs) if costs else np.zeros(0)
+            probs = np.concatenate(probs) if probs else np.zeros(0)
+            debug_print("total probability:", probs.sum())
+            in_range = costs < (steps + 1) * a
+            support, inverse = np.unique(costs[in_range], return_inverse=True)
+            pmf = np.bincount(inverse, weights=probs[in_range], minlength=len(support))
+            if support.size and support[0] == 0:
+                xs = support.astype(float)
+            else:
+                xs = np.concatenate(([0.0], support))
+                pmf = np.concatenate(([0.0], pmf))
+            ys = np.cumsum(pmf)
             debug_print("Done")
             return xs, ys
         elif method == 'CFsym':
+            import sympy as sp
+
             debug_print("initialize")
             t = sp.Symbol('t')
             A = sp.zeros(self.target_level, self.target_level)
@@ -173,31 +358,45 @@ class Action:
             ys = cdf_full[:end + 1]
             xs = np.arange(end + 1)
             return xs, ys
-        elif method == 'CFnum':
-            end = int(steps * self.enhance_cost)
-            samples_N = 2 ** max(12, 2 + int(np.ceil(np.log2((end + 1024)))))
-            debug_print('samples N =', samples_N)
-            j = np.arange(0,samples_N)
-            t = 2 * np.pi * j / samples_N
+        elif method in ('CF', 'CFnum'):
             debug_print('initialize')
-            A = self.P[:-1, :-1] * np.exp(1j * t[:, None,None] * self.H[:-1, :-1])
-            b = (self.P[:-1,-1] * np.exp(1j * t[:, np.newaxis] * self.H[:-1, -1]))[..., np.newaxis]
-            I = np.eye(self.target_level)
-            debug_print('compute phi')
-            print((I-A)[samples_N//3])
-            print(np.linalg.inv(I-A)[samples_N//3])
-            phi_samples = np.linalg.solve((I-A),b)[:,0,0]
-            debug_print('compute IFFT')
-            pmf = np.fft.ifft(np.conj(phi_samples)).real
-            # pmf = np.clip(pmf, 0, None)
-            pmf[np.abs(pmf) <= tol] = 0
-            total_prob = np.sum(pmf)
-            debug_print('total probability:', total_prob)
-            if total_prob <= 0:
-                raise ValueError('Failed: Negative Probability')
-            pmf /= total_prob
+            units, resolution = self.lattice_costs(resolution)
+            end_units = int(steps * self.enhance_cost) // resolution
+            pmf = self.lattice_pmf(units, tol, chunk_size, end_units, debug_print, 'recurrence' if method == 'CF' else 'dense')
             cdf_full = np.cumsum(pmf)
-
-            ys = cdf_full[:end + 1]
-            xs = np.arange(0,end + 1)
+            if len(cdf_full) < end_units + 1:
+                cdf_full = np.concatenate((cdf_full, np.full(end_units + 1 - len(cdf_full), cdf_full[-1])))
+            ys = cdf_full[:end_units + 1]
+            xs = np.arange(0, end_units + 1) * resolution
             return xs, ys
+
+@functools.lru_cache(maxsize=256)
+def expectation_table(bless, bonus_rate):
+    """
+    Expected steps, protects and exp of every Action(target_level, protect_level, bless, bonus_rate),
+    as (MAX_LEVEL + 1) x (MAX_LEVEL + 1) arrays indexed by [target_level, protect_level].
+    None of them depend on enhance_cost or protect_cost, the expected cost of an action is
+    enhance_cost * steps + protect_cost * protects.
+    """
+    steps = np.zeros((MAX_LEVEL + 1, MAX_LEVEL + 1))
+    protects = np.zeros((MAX_LEVEL + 1, MAX_LEVEL + 1))
+    exp = np.zeros((MAX_LEVEL + 1, MAX_LEVEL + 1))
+    for target_level in range(1, MAX_LEVEL + 1):
+        # Action clamps protect_level to at least 2, and any protect_level >= target_level means no protection
+        for protect_level in range(2, target_level + 1):
+            act = Action(target_level, protect_level, bless, bonus_rate)
+            steps[target_level, protect_level] = act.expected_steps
+            protects[target_level, protect_level] = act.expected_protect
+            exp[target_level, protect_level] = act.expected_exp
+        clamped = max(2, target_level)
+        if target_level < 2:
+            act = Action(target_level, clamped, bless, bonus_rate)
+            steps[target_level, clamped] = act.expected_steps
+            protects[target_level, clamped] = act.expected_protect
+            exp[target_level, clamped] = act.expected_exp
+        for table in (steps, protects, exp):
+            table[target_level, :2] = table[target_level, 2]
+            table[target_level, clamped + 1:] = table[target_level, clamped]
+    for table in (steps, protects, exp):
+        table.flags.writeable = False
+    return ExpectationTable(steps, protects, exp)
@@ -0,0 +1,199 @@
+"""
+init_client_data.json parsed once per process into the maps the project uses plus compact indexed tables.
+
+The parsed result is persisted as a snapshot directory keyed on gameVersion: the maps are pickled, every table
+is a separate .npy file opened with mmap_mode='r', so later processes skip the JSON parse and share the pages.
+"""
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+INIT_CLIENT_DATA_PATH = os.path.join(ROOT, 'init_client_data.json')
+SNAPSHOT_DIR = os.path.join(ROOT, '.cache', 'game_data')
+SNAPSHOT_FORMAT = 2
+
+CLIENT_DATA_KEYS = ('type', 'gameVersion', 'versionTimestamp',
+                    'itemDetailMap', 'openableLootDropMap', 'shopItemDetailMap', 'houseRoomDetailMap', 'actionDetailMap')
+ACTION_FUNCTIONS = ('/action_functions/gathering', '/action_functions/production')
+ACTION_DROP_TABLES = ('dropTable', 'essenceDropTable', 'rareDropTable')
+
+
+class GameData:
+    """
+    client_data : the subset of init_client_data listed in CLIENT_DATA_KEYS, as nested dicts
+    item_hrids, item_index : stable item order, item hrid -> integer id
+    house_hrids, house_index : stable house room order, house hrid -> integer id
+    action_hrids, action_index : gathering and production actions (ACTION_FUNCTIONS), action hrid -> integer id
+    tables : numpy arrays, CSR style (`*_offsets[k]:*_offsets[k + 1]` are the rows of item / house k)
+        item_level
+        enhancement_offsets, enhancement_item, enhancement_count
+        loot_offsets, loot_item, loot_drop_rate, loot_min_count, loot_max_count
+        shop_item, shop_cost_item, shop_cost_count
+        house_offsets (per house, into house_level), house_level, house_cost_offsets, house_cost_item, house_cost_count
+        action_time_cost (ns), action_level_requirement
+        action_input_offsets, action_input_item, action_input_count (inputItems plus the upgrade item)
+        action_output_offsets, action_output_item, action_output_count (outputItems plus expected drop table counts)
+    reverse indexes, built on load :
+        shop_offers : currency item hrid -> [(shop item hrid, cost count)]
+        ability_books : ability hrid -> [(book item hrid, experience gained per book)]
+        house_costs : house hrid -> [{item hrid: cumulative count to reach that level}], indexed by level
+    """
+
+    def __init__(self, client_data, item_hrids, house_hrids, action_hrids, tables):
+        self.client_data = client_data
+        self.game_version = client_data['gameVersion']
+        self.item_hrids = item_hrids
+        self.item_index = {item_hrid: index for index, item_hrid in enumerate(item_hrids)}
+        self.house_hrids = house_hrids
+        self.house_index = {house_hrid: index for index, house_hrid in enumerate(house_hrids)}
+        self.action_hrids = action_hrids
+        self.action_index = {action_hrid: index for index, action_hrid in enumerate(action_hrids)}
+        self.tables = tables
+        for name, table in tables.items():
+            setattr(self, name, table)
+        self.shop_offers = {}
+        for shop_item, cost_item, cost_count in zip(self.shop_item.tolist(), self.shop_cost_item.tolist(), self.shop_cost_count.tolist()):
+            self.shop_offers.setdefault(item_hrids[cost_item], []).append((item_hrids[shop_item], cost_count))
+        self.ability_books = {}
+        for item_hrid, item_detail in client_data['itemDetailMap'].items():
+            if 'abilityBookDetail' in item_detail:
+                book = item_detail['abilityBookDetail']
+                self.ability_books.setdefault(book['abilityHrid'], []).append((item_hrid, book['experienceGain']))
+        self.house_costs = {}
+        for house, house_hrid in enumerate(house_hrids):
+            cumulative = [{}]
+            for row in range(self.house_offsets[house], self.house_offsets[house + 1]):
+                assert self.house_level[row] == len(cumulative)
+                costs = dict(cumulative[-1])
+                for cost in range(self.house_cost_offsets[row], self.house_cost_offsets[row + 1]):
+                    cost_hrid = item_hrids[self.house_cost_item[cost]]
+                    costs[cost_hrid] = costs.get(cost_hrid, 0) + int(self.house_cost_count[cost])
+                cumulative.append(costs)
+            self.house_costs[house_hrid] = cumulative
+
+    @classmethod
+    def from_client_data(cls, init_client_data):
+        client_data = {key: init_client_data[key] for key in CLIENT_DATA_KEYS}
+        item_hrids = list(client_data['itemDetailMap'])
+        item_index = {item_hrid: index for index, item_hrid in enumerate(item_hrids)}
+        house_hrids = list(client_data['houseRoomDetailMap'])
+        item_detail_map = client_data['itemDetailMap']
+
+        def csr(rows, columns):
+            offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(row) for row in rows])
+            flat = [entry for row in rows for entry in row]
+            return [offsets] + [np.array([entry[k] for entry in flat], dtype=dtype) for k, dtype in enumerate(columns)]
+
+        tables = {'item_level': np.array([item_detail_map[item_hrid].get('itemLevel', 0) for item_hrid in item_hrids], dtype=np.int64)}
+        (tables['enhancement_offsets'], tables['enhancement_item'], tables['enhancement_count']) = csr(
+            [[(item_index[cost['itemHrid']], cost['count']) for cost in item_detail_map[item_hrid].get('enhancementCosts') or []]
+             for item_hrid in item_hrids],
+            (np.int64, np.int64))
+        loot_drop_map = client_data['openableLootDropMap']
+        (tables['loot_offsets'], tables['loot_item'], tables['loot_drop_rate'], tables['loot_min_count'], tables['loot_max_count']) = csr(
+            [[(item_index[loot['itemHrid']], loot['dropRate'], loot['minCount'], loot['maxCount']) for loot in loot_drop_map.get(item_hrid, [])]
+             for item_hrid in item_hrids],
+            (np.int64, np.float64, np.float64, np.float64))
+        shop_items = list(client_data['shopItemDetailMap'].values())
+        tables['shop_item'] = np.array([item_index[detail['itemHrid']] for detail in shop_items], dtype=np.int64)
+        tables['shop_cost_item'] = np.array([item_index[detail['costs'][0]['itemHrid']] for detail in shop_items], dtype=np.int64)
+        tables['shop_cost_count'] = np.array([detail['costs'][0]['count'] for detail in shop_items], dtype=np.int64)
+        house_levels = [sorted(int(level) for level in client_data['houseRoomDetailMap'][house_hrid]['upgradeCostsMap']) for house_hrid in house_hrids]
+        tables['house_offsets'] = np.zeros(len(house_hrids) + 1, dtype=np.int64)
+        tables['house_offsets'][1:] = np.cumsum([len(levels) for levels in house_levels])
+        tables['house_level'] = np.array([level for levels in house_levels for level in levels], dtype=np.int64)
+        (tables['house_cost_offsets'], tables['house_cost_item'], tables['house_cost_count']) = csr(
+            [[(item_index[cost['itemHrid']], cost['count'])
+              for cost in client_data['houseRoomDetailMap'][house_hrid]['upgradeCostsMap'][str(level)]]
+             for house_hrid, levels in zip(house_hrids, house_levels) for level in levels],
+            (np.int64, np.int64))
+        action_detail_map = client_data['actionDetailMap']
+        action_hrids = [action_hrid for action_hrid, action in action_detail_map.items() if action['function'] in ACTION_FUNCTIONS]
+        actions = [action_detail_map[action_hrid] for action_hrid in action_hrids]
+        tables['action_time_cost'] = np.array([action['baseTimeCost'] for action in actions], dtype=np.int64)
+        tables['action_level_requirement'] = np.array([action['levelRequirement']['level'] for action in actions], dtype=np.int64)
+        (tables['action_input_offsets'], tables['action_input_item'], tables['action_input_count']) = csr(
+            [[(item_index[entry['itemHrid']], entry['count']) for entry in action['inputItems'] or []] +
+             ([(item_index[action['upgradeItemHrid']], 1)] if action['upgradeItemHrid'] else [])
+             for action in actions],
+            (np.int64, np.int64))
+        (tables['action_output_offsets'], tables['action_output_item'], tables['action_output_count']) = csr(
+            [[(item_index[entry['itemHrid']], entry['count']) for entry in action['outputItems'] or []] +
+             [(item_index[drop['itemHrid']], drop['dropRate'] * (drop['minCount'] + drop['maxCount']) / 2)
+              for table in ACTION_DROP_TABLES for drop in action[table] or []]
+             for action in actions],
+            (np.int64, np.float64))
+        return cls(client_data, item_hrids, house_hrids, action_hrids, tables)
+
+    def save(self, path):
+        """
+        Write the snapshot directory atomically, so concurrent readers never see a partial one.
+        """
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent)
+        try:
+            with open(os.path.join(tmp, 'client_data.pickle'), 'wb') as f:
+                pickle.dump({'format': SNAPSHOT_FORMAT, 'client_data': self.client_data,
+                             'item_hrids': self.item_hrids, 'house_hrids': self.house_hrids, 'action_hrids': self.action_hrids,
+                             'tables': sorted(self.tables)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            for name, table in self.tables.items():
+                np.save(os.path.join(tmp, f'{name}.npy'), np.ascontiguousarray(table))
+            os.replace(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, 'client_data.pickle'), 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot['format'] != SNAPSHOT_FORMAT:
+            raise ValueError(f'snapshot format {snapshot["format"]} != {SNAPSHOT_FORMAT}')
+        tables = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in snapshot['tables']}
+        return cls(snapshot['client_data'], snapshot['item_hrids'], snapshot['house_hrids'], snapshot['action_hrids'], tables)
+
+
+def read_game_version(path):
+    """
+    gameVersion from the head of init_client_data.json, without parsing the whole file.
+    """
+    with open(path, encoding='utf-8') as f:
+        match = re.search(r'"gameVersion"\s*:\s*"([^"]+)"', f.read(4096))
+    return match.group(1) if match else None
+
+
+def snapshot_path(game_version, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f'{game_version}-format{SNAPSHOT_FORMAT}')
+
+
+def load(path=INIT_CLIENT_DATA_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Open the snapshot of this gameVersion, or parse the JSON and write one.
+    snapshot_dir=None always parses the JSON and writes nothing.
+    """
+    game_version = read_game_version(path)
+    if snapshot_dir is not None and game_version is not None:
+        try:
+            return GameData.open(snapshot_path(game_version, snapshot_dir))
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+            pass
+    with open(path, encoding='utf-8') as f:
+        game_data = GameData.from_client_data(json.load(f))
+    if snapshot_dir is not None:
+        try:
+            game_data.save(snapshot_path(game_data.game_version, snapshot_dir))
+        except OSError:
+            pass
+    return game_data
+
+
+GAME_DATA = load()
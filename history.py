@@ -0,0 +1,185 @@
+"""
+Append-only store of market price snapshots, for querying prices as of a past time.
+
+Each snapshot is the pair of flat int64 arrays Market keeps in market_prices (index Item.index * ENHANCE_LEVELS
++ enhance_level, -1 where missing), stored sparsely as the entries that changed against the previous snapshot.
+Every keyframe_interval snapshots a keyframe stores all present entries instead, so a read never replays more
+than keyframe_interval snapshots. Columns are raw little-endian files read through np.memmap:
+    times.i64      snapshot timestamp (marketData timestamp), appended last, so its length is the committed count
+    ends.i64       end offset of each snapshot's entries in keys / values
+    keyframes.u8   1 for keyframes
+    keys.i32       mode * len(ITEM_HRIDS) * ENHANCE_LEVELS + node
+    values.i64     absolute price in keyframes, difference to the previous snapshot otherwise
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+import item as item_module
+
+HISTORY_FORMAT = 1
+MODES = ('a', 'b')
+COLUMNS = {'times': np.int64, 'ends': np.int64, 'keyframes': np.uint8, 'keys': np.int32, 'values': np.int64}
+
+
+class MarketHistory:
+    def __init__(self, directory, keyframe_interval=144):
+        self.directory = directory
+        self.size = len(item_module.ITEM_HRIDS) * item_module.ENHANCE_LEVELS
+        self.lock = threading.Lock()
+        self.maps = {}
+        self.cursor = None
+        meta_path = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['format'] != HISTORY_FORMAT:
+                raise ValueError(f'history format {meta["format"]} != {HISTORY_FORMAT}')
+            if meta['item_hrids'] != item_module.ITEM_HRIDS or meta['enhance_levels'] != item_module.ENHANCE_LEVELS:
+                raise ValueError(f'{directory} was recorded with a different item catalog')
+            self.keyframe_interval = meta['keyframe_interval']
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.keyframe_interval = keyframe_interval
+            tmp = f'{meta_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'format': HISTORY_FORMAT, 'item_hrids': item_module.ITEM_HRIDS,
+                           'enhance_levels': item_module.ENHANCE_LEVELS, 'keyframe_interval': keyframe_interval}, f)
+            os.replace(tmp, meta_path)
+        self.repair()
+
+    def path(self, name):
+        return os.path.join(self.directory, f'{name}.{np.dtype(COLUMNS[name]).str[1:]}')
+
+    def column(self, name):
+        """
+        Read-only memmap of a column file, remapped when the file has grown.
+        """
+        path = self.path(name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        dtype = np.dtype(COLUMNS[name])
+        cached = self.maps.get(name)
+        if cached is None or cached[0] != size:
+            array = np.memmap(path, dtype=dtype, mode='r') if size >= dtype.itemsize else np.zeros(0, dtype=dtype)
+            self.maps[name] = cached = (size, array)
+        return cached[1]
+
+    def repair(self):
+        """
+        Cut the other columns back to the committed snapshot count, dropping the tail of an interrupted append.
+        """
+        count = len(self.column('times'))
+        end = int(self.column('ends')[count - 1]) if count else 0
+        for name, length in (('ends', count), ('keyframes', count), ('keys', end), ('values', end)):
+            path = self.path(name)
+            if os.path.exists(path) and os.path.getsize(path) > length * np.dtype(COLUMNS[name]).itemsize:
+                self.maps.pop(name, None)
+                with open(path, 'r+b') as f:
+                    f.truncate(length * np.dtype(COLUMNS[name]).itemsize)
+
+    def __len__(self):
+        return len(self.column('times'))
+
+    @property
+    def times(self):
+        return self.column('times')
+
+    def append(self, timestamp, market_prices):
+        """
+        Record one snapshot. Returns False without writing if timestamp is not newer than the last one.
+        """
+        with self.lock:
+            count = len(self)
+            if count and timestamp <= self.times[-1]:
+                return False
+            flat = np.concatenate([market_prices[mode] for mode in MODES])
+            keyframe = count % self.keyframe_interval == 0
+            if keyframe:
+                keys = np.flatnonzero(flat != -1)
+                values = flat[keys]
+            else:
+                previous = self.state(count - 1)
+                keys = np.flatnonzero(flat != previous)
+                values = flat[keys] - previous[keys]
+            end = (int(self.column('ends')[-1]) if count else 0) + len(keys)
+            for name, data in (('keys', keys), ('values', values), ('ends', [end]), ('keyframes', [keyframe]), ('times', [timestamp])):
+                with open(self.path(name), 'ab') as f:
+                    f.write(np.asarray(data, dtype=COLUMNS[name]).tobytes())
+            self.cursor = (count, flat)
+            return True
+
+    def state(self, index):
+        """
+        Both modes of snapshot `index` as one flat array (a then b). Replays from the nearest keyframe,
+        or forward from the last state read when that is closer, so sequential reads cost one delta each.
+        """
+        if self.cursor is not None and self.cursor[0] == index:
+            return self.cursor[1]
+        ends = self.column('ends')
+        keyframes = self.column('keyframes')
+        keys = self.column('keys')
+        values = self.column('values')
+        start = index - int(np.argmax(keyframes[max(index - self.keyframe_interval + 1, 0):index + 1][::-1]))
+        if self.cursor is not None and start <= self.cursor[0] < index:
+            start, flat = self.cursor[0] + 1, self.cursor[1].copy()
+        else:
+            flat = np.full(len(MODES) * self.size, -1, dtype=np.int64)
+        for i in range(start, index + 1):
+            begin, end = (int(ends[i - 1]) if i else 0), int(ends[i])
+            if keyframes[i]:
+                flat[:] = -1
+                flat[keys[begin:end]] = values[begin:end]
+            else:
+                flat[keys[begin:end]] += values[begin:end]
+        self.cursor = (index, flat)
+        return flat
+
+    def index_at(self, timestamp):
+        """
+        Index of the last snapshot taken at or before timestamp.
+        """
+        index = int(np.searchsorted(self.times, timestamp, side='right')) - 1
+        if index < 0:
+            raise KeyError(f'no market snapshot at or before {timestamp}')
+        return index
+
+    def prices_at(self, timestamp):
+        """
+        (snapshot timestamp, market_prices) as of timestamp, market_prices shaped like Market.market_prices.
+        """
+        index = self.index_at(timestamp)
+        flat = self.state(index)
+        return int(self.times[index]), {mode: flat[k * self.size:(k + 1) * self.size].copy() for k, mode in enumerate(MODES)}
+
+    def range(self, start=None, end=None):
+        """
+        Snapshot indices with start <= timestamp <= end, None leaves that side open.
+        """
+        times = self.times
+        first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        last = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+        return range(first, last)
+
+    def snapshots(self, start=None, end=None):
+        """
+        Yield (timestamp, market_prices) for every snapshot in [start, end].
+        """
+        for index in self.range(start, end):
+            flat = self.state(index)
+            yield int(self.times[index]), {mode: flat[k * self.size:(k + 1) * self.size].copy() for k, mode in enumerate(MODES)}
+
+    def series(self, items, mode, start=None, end=None):
+        """
+        Raw market prices of items over [start, end] : (timestamps, int64 array of shape (snapshots, len(items))), -1 where missing.
+        """
+        assert mode in MODES
+        items = list(items)
+        keys = MODES.index(mode) * self.size + np.fromiter(
+            (it.index * item_module.ENHANCE_LEVELS + it.enhance_level for it in items), dtype=np.intp, count=len(items))
+        indices = self.range(start, end)
+        prices = np.empty((len(indices), len(items)), dtype=np.int64)
+        for row, index in enumerate(indices):
+            prices[row] = self.state(index)[keys]
+        return np.array(self.times[indices.start:indices.stop]), prices
@@ -1,5 +1,13 @@
 import json
 
-with open('init_client_data.json', 'r', encoding='utf-8') as f:
-    INIT_CLIENT_DATA = json.load(f)
+from game_data import INIT_CLIENT_DATA_PATH
 
+
+def __getattr__(name):
+    # the whole init_client_data.json, parsed on first use only : the project itself reads
+    # game_data.GAME_DATA.client_data, which keeps just game_data.CLIENT_DATA_KEYS
+    if name == 'INIT_CLIENT_DATA':
+        with open(INIT_CLIENT_DATA_PATH, 'r', encoding='utf-8') as f:
+            globals()[name] = json.load(f)
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
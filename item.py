@@ -1,29 +1,55 @@
 import json
-import weakref
-from init_client_data import INIT_CLIENT_DATA
+from game_data import GAME_DATA
 
 with open('e2c.json', 'r', encoding='utf-8') as f:
     E2C = json.load(f)
 
+ITEM_HRIDS = GAME_DATA.item_hrids
+ITEM_INDEX = GAME_DATA.item_index
+ENHANCE_LEVELS = 21
+
 
 class Item:
-    _pool = weakref.WeakValueDictionary()
-
-    def __new__(cls, item_hrid, enhance_level=0, *args, **kwargs):
-        assert enhance_level in range(0, 21)
-        if (item_hrid, enhance_level) in cls._pool:
-            return cls._pool[(item_hrid, enhance_level)]
-        else:
-            obj = super().__new__(cls)
-            cls._pool[(item_hrid, enhance_level)] = obj
-            return obj
-
-    def __init__(self, item_hrid, enhance_level=0):
-        self.item_hrid = item_hrid
-        self.enhance_level = enhance_level
-        self.item_detail = INIT_CLIENT_DATA["itemDetailMap"][item_hrid]
-        self.name_en = f"{self.item_detail['name']}+{self.enhance_level}"
-        self.name_zh = f"{E2C.get(self.item_hrid, self.name_en)}+{self.enhance_level}"
+    """
+    Interned (item_hrid, enhance_level). Item(...) is one dict lookup once the pair has been seen, the pool holds
+    strong references and is bounded by the catalog (len(ITEM_HRIDS) * ENHANCE_LEVELS). Names are built on first use.
+    """
+    __slots__ = ('item_hrid', 'enhance_level', 'index', 'node', 'item_detail', '_name_en', '_name_zh')
+    # strong references, entries are never freed : the pool is bounded by the catalog, which catalog() keeps alive
+    # anyway, and __slots__ leaves no __weakref__ for a WeakValueDictionary
+    _pool = {}
+
+    def __new__(cls, item_hrid, enhance_level=0):
+        try:
+            return cls._pool[item_hrid, enhance_level]
+        except KeyError:
+            pass
+        assert enhance_level in range(0, ENHANCE_LEVELS)
+        obj = super().__new__(cls)
+        obj.item_hrid = item_hrid
+        obj.enhance_level = enhance_level
+        obj.index = ITEM_INDEX[item_hrid]
+        obj.node = obj.index * ENHANCE_LEVELS + enhance_level
+        obj.item_detail = GAME_DATA.client_data["itemDetailMap"][item_hrid]
+        obj._name_en = None
+        obj._name_zh = None
+        cls._pool[item_hrid, enhance_level] = obj
+        return obj
+
+    def __reduce__(self):
+        return Item, (self.item_hrid, self.enhance_level)
+
+    @property
+    def name_en(self):
+        if self._name_en is None:
+            self._name_en = f"{self.item_detail['name']}+{self.enhance_level}"
+        return self._name_en
+
+    @property
+    def name_zh(self):
+        if self._name_zh is None:
+            self._name_zh = f"{E2C.get(self.item_hrid, self.name_en)}+{self.enhance_level}"
+        return self._name_zh
 
     def __repr__(self):
         return f"Item({self.item_hrid})"
@@ -36,4 +62,21 @@ class Item:
         return repr(self)
 
 
+CATALOG = None
+
+
+def catalog():
+    """
+    Every Item of every catalog item and enhance level, as a list indexed by Item.node.
+    """
+    global CATALOG
+    if CATALOG is None:
+        CATALOG = [Item(item_hrid, enhance_level) for item_hrid in ITEM_HRIDS for enhance_level in range(ENHANCE_LEVELS)]
+    return CATALOG
+
+
+def from_node(node):
+    return catalog()[node]
+
+
 COIN = Item("/items/coin")
@@ -1,85 +1,374 @@
 import math
+import os
+import threading
 import time
 
 import requests
 import json
 import datetime
 
+import numpy as np
+
 import enhance
 import item as item_module
+import game_data
+import metrics
+from game_data import GAME_DATA
 from item import Item
+from price_graph import PriceGraph
 
 OFFICIAL_MARKET_API = 'https://www.milkywayidle.com/game_data/marketplace.json'
 MOOKET_MARKET_API = 'https://mooket.qi-e.top/market/api.json'
+MARKET_SNAPSHOT_PATH = os.path.join(game_data.ROOT, '.cache', 'market', 'snapshot.json')
+
+CHEST_KEYS = {
+    '/items/chimerical_chest': '/items/chimerical_chest_key',
+    '/items/sinister_chest': '/items/sinister_chest_key',
+    '/items/enchanted_chest': '/items/enchanted_chest_key',
+    '/items/pirate_chest': '/items/pirate_chest_key',
+}
+DUNGEON_TOKENS = ('/items/chimerical_token', '/items/sinister_token', '/items/enchanted_token', '/items/pirate_token')
+BACK_SLOTS = ('/items/chimerical_quiver', '/items/sinister_cape', '/items/enchanted_cloak')
+TASK_BADGES = ('/items/basic_task_badge', '/items/advanced_task_badge', '/items/expert_task_badge')
+TASK_TOKEN_CRATES = ('/items/large_meteorite_cache', '/items/large_artisans_crate', '/items/large_treasure_chest')
+# a failed request, or a 200 whose payload is not valid marketplace JSON
+REFRESH_ERRORS = (requests.RequestException, ValueError, KeyError, TypeError)
+
+
+# the price graph is built for these, Market rebuilds it when one of them is changed on the instance
+PRICING_OPTIONS = ('default_price_a', 'default_price_b', 'enhance_item_mode', 'cowbell_price', 'back_slot_price', 'bonus_profile')
+# wrapped by Market.enable_metrics, the loot / token / enhanced rule branches plus plain market lookups and refresh steps
+# pricing options the price graph's nodes and dependencies depend on (see build_price_graph)
+GRAPH_OPTIONS = ('enhance_item_mode', 'cowbell_price', 'back_slot_price')
+# built graphs without a compute, keyed on (Market type, GRAPH_OPTIONS values), copied by every Market using those options
+PRICE_GRAPHS = {}
 
-with open('init_client_data.json', encoding='utf-8') as f:
-    INIT_CLIENT_DATA = json.load(f)
+INSTRUMENTED_METHODS = ('get_loot_price', 'get_dungeon_token_price', 'get_task_token_price', 'get_enhanced_price', 'get_market_price',
+                        'refresh_market_data', 'fetch_market_data', 'load_market_data')
 
 
 class Market:
-    def __init__(self, default_price_a=100_000_000_000, default_price_b=0, enhance_item_mode='fallback', cowbell_price=False, back_slot_price=False):
+    """
+    url : marketplace JSON to fetch, through a pooled session with conditional requests
+    snapshot_path : where the last good payload is persisted, used when the network is unavailable (None disables it)
+    background_refresh : refresh every refresh_interval seconds on a daemon thread instead of inside get_price.
+        With a snapshot on disk the constructor does not wait for the network at all.
+    history : history.MarketHistory that records every new market snapshot, queried by at() and price_history()
+    bonus_profile : enhance.BonusProfile used to price enhanced items
+    Warnings go through the 'markethandler' logger, rate limited per kind, see event(). enable_metrics() adds counters and timers.
+    url=None builds an offline Market that never fetches, its prices come from load_market_prices().
+    """
+
+    def __init__(self, default_price_a=100_000_000_000, default_price_b=0, enhance_item_mode='fallback', cowbell_price=False, back_slot_price=False,
+                 url=MOOKET_MARKET_API, snapshot_path=MARKET_SNAPSHOT_PATH, background_refresh=False, refresh_interval=600, timeout=30,
+                 history=None, bonus_profile=enhance.DEFAULT_PROFILE):
         self.market_data = None
         self.market_data_time = None
         self.last_update_time = None
-        self.market_cache = None
-        self.refresh_market_data()
+        self.market_prices = None
+        self.price_vectors = None
+        self.verbose = True
+        self.events = metrics.EventLimiter()
+        self.metrics = None
         self.default_price_a = default_price_a
         self.default_price_b = default_price_b
         self.enhance_item_mode = enhance_item_mode
         self.cowbell_price = cowbell_price
         self.back_slot_price = back_slot_price
+        self.bonus_profile = bonus_profile
+        self.url = url
+        self.snapshot_path = snapshot_path
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.etag = None
+        self.last_modified = None
+        self.lock = threading.RLock()
+        self.refresh_thread = None
+        self.refresh_stop = threading.Event()
+        self.history = history
+        self.price_graph = self.build_price_graph()
+        self.price_graph_options = self.pricing_options()
+        if url is None:
+            return
+        if not (background_refresh and self.load_snapshot()):
+            try:
+                self.refresh_market_data()
+            except REFRESH_ERRORS as e:
+                if not self.load_snapshot():
+                    raise
+                self.event('refresh_failed', f'market refresh failed, using snapshot from {self.snapshot_time()}: {e}', url=self.url)
+        if background_refresh:
+            self.start_refresh()
 
     def __str__(self):
         return (f"Last Update: {datetime.datetime.fromtimestamp(self.last_update_time).strftime('%Y-%m-%d %H:%M:%S')}\n"
                 f"Market Data: {datetime.datetime.fromtimestamp(self.market_data_time).strftime('%Y-%m-%d %H:%M:%S')}")
 
-    def refresh_market_data(self, url=MOOKET_MARKET_API):
-        response = requests.get(url)
+    def refresh_market_data(self, url=None):
+        """
+        Fetch the marketplace and swap it in if it changed. Download and parsing happen outside the lock,
+        readers only wait for the swap itself.
+        """
+        url = url or self.url
+        data = self.fetch_market_data(url)
+        if data is not None:
+            try:
+                self.load_market_data(data)
+            except REFRESH_ERRORS:
+                # do not let the validators of a bad payload turn the next request into a 304
+                self.etag = self.last_modified = None
+                raise
+            self.save_snapshot(url, data)
+        self.last_update_time = time.time()
+
+    def fetch_market_data(self, url):
+        """
+        Conditional GET through the pooled session. Returns None when the server answers 304,
+        or when the payload timestamp shows the data did not change.
+        """
+        headers = {}
+        if url == self.url and self.etag:
+            headers['If-None-Match'] = self.etag
+        if url == self.url and self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None
         response.raise_for_status()
         data = response.json()
-        self.market_data = data['marketData']
-        self.market_data_time = data['timestamp']
-        self.last_update_time = time.time()
-        self.market_cache = {}
+        timestamp = data['timestamp']
+        if url == self.url:
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+        if timestamp == self.market_data_time:
+            return None
+        return data
+
+    def load_market_data(self, data):
+        market_prices = self.parse_market_prices(data['marketData'])
+        self.load_market_prices(market_prices, data['timestamp'], data['marketData'])
+        if self.history is not None:
+            self.history.append(data['timestamp'], market_prices)
+
+    def load_market_prices(self, market_prices, market_data_time, market_data=None):
+        """
+        Swap in parsed market prices, invalidating only the price nodes downstream of entries that changed.
+        market_data defaults to the marketData dict rebuilt from the arrays.
+        """
+        if market_data is None:
+            market_data = self.format_market_data(market_prices)
+        with self.lock:
+            for mode in ('a', 'b'):
+                if self.market_prices is None:
+                    self.price_graph.invalidate(mode)
+                else:
+                    self.price_graph.invalidate(mode, np.flatnonzero(market_prices[mode] != self.market_prices[mode]))
+            self.market_data = market_data
+            self.market_data_time = market_data_time
+            self.market_prices = market_prices
+            self.price_vectors = {}
+
+    def save_snapshot(self, url, data):
+        if self.snapshot_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp = f'{self.snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'etag': self.etag, 'last_modified': self.last_modified, 'fetch_time': time.time(), 'data': data}, f)
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            self.event('snapshot_error', f'could not save market snapshot: {e}', path=self.snapshot_path)
+
+    def load_snapshot(self):
+        """
+        Load the last good payload from snapshot_path. Returns False when there is none.
+        """
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            self.event('snapshot_error', f'could not read market snapshot: {e}', path=self.snapshot_path)
+            return False
+        self.load_market_data(snapshot['data'])
+        if snapshot['url'] == self.url:
+            self.etag = snapshot['etag']
+            self.last_modified = snapshot['last_modified']
+        self.last_update_time = snapshot['fetch_time']
+        return True
+
+    def snapshot_time(self):
+        return datetime.datetime.fromtimestamp(self.market_data_time).strftime('%Y-%m-%d %H:%M:%S')
+
+    def start_refresh(self):
+        if self.refresh_thread is not None:
+            return
+        self.refresh_stop.clear()
+        self.refresh_thread = threading.Thread(target=self.refresh_loop, name='market-refresh', daemon=True)
+        self.refresh_thread.start()
+
+    def stop_refresh(self):
+        if self.refresh_thread is None:
+            return
+        self.refresh_stop.set()
+        self.refresh_thread.join()
+        self.refresh_thread = None
+
+    def refresh_loop(self):
+        while True:
+            delay = self.last_update_time + self.refresh_interval - time.time()
+            if self.refresh_stop.wait(max(delay, 0)):
+                return
+            try:
+                self.refresh_market_data()
+            except REFRESH_ERRORS as e:
+                self.event('refresh_failed', f'market refresh failed, keeping data from {self.snapshot_time()}: {e}', url=self.url)
+                self.last_update_time = time.time()
+
+    def auto_refresh(self, force_refresh, auto_refresh_time):
+        if force_refresh:
+            self.refresh_market_data()
+        elif self.url is not None and self.refresh_thread is None and time.time() - self.last_update_time > auto_refresh_time:
+            try:
+                self.refresh_market_data()
+            except REFRESH_ERRORS as e:
+                self.event('refresh_failed', f'market refresh failed, keeping data from {self.snapshot_time()}: {e}', url=self.url)
+                self.last_update_time = time.time()
+
+    @staticmethod
+    def parse_market_prices(market_data):
+        """
+        Flatten marketData into one int64 array per mode, indexed like the price graph nodes
+        (Item.index * ENHANCE_LEVELS + enhance_level). Missing entries are -1.
+        """
+        market_prices = {mode: np.full(len(item_module.ITEM_HRIDS) * item_module.ENHANCE_LEVELS, -1, dtype=np.int64) for mode in ('a', 'b')}
+        for item_hrid, levels in market_data.items():
+            if item_hrid not in item_module.ITEM_INDEX:
+                continue
+            offset = item_module.ITEM_INDEX[item_hrid] * item_module.ENHANCE_LEVELS
+            for enhance_level, prices in levels.items():
+                for mode in ('a', 'b'):
+                    market_prices[mode][offset + int(enhance_level)] = prices.get(mode, -1)
+        return market_prices
+
+    @staticmethod
+    def format_market_data(market_prices):
+        """
+        Inverse of parse_market_prices.
+        """
+        market_data = {}
+        present = (market_prices['a'] != -1) | (market_prices['b'] != -1)
+        for node in np.flatnonzero(present).tolist():
+            index, enhance_level = divmod(node, item_module.ENHANCE_LEVELS)
+            market_data.setdefault(item_module.ITEM_HRIDS[index], {})[str(enhance_level)] = {
+                mode: int(market_prices[mode][node]) for mode in ('a', 'b')}
+        return market_data
+
+    def get_market_price(self, item: Item, mode):
+        return int(self.market_prices[mode][item.index * item_module.ENHANCE_LEVELS + item.enhance_level])
+
+    def event(self, kind, message, **fields):
+        """
+        Counted under kind when metrics are enabled, logged (rate limited per kind) when verbose.
+        """
+        if self.metrics is not None:
+            self.metrics.count(kind)
+        if self.verbose:
+            self.events.emit(kind, message, **fields)
+
+    def enable_metrics(self, market_metrics=None):
+        """
+        Wrap the pricing rules, market lookups, refresh steps and price graph of this Market with counters and timers.
+        Returns the metrics.Metrics collecting them.
+        """
+        self.disable_metrics()
+        market_metrics = market_metrics or metrics.Metrics()
+        for name in INSTRUMENTED_METHODS:
+            setattr(self, name, market_metrics.timed(name, getattr(type(self), name).__get__(self), histogram=name == 'refresh_market_data'))
+        graph = self.price_graph
+        updates = [0]
+        computing = [0]
+        # node -> length of the longest chain of nodes recomputed below it (itself included), for the current resolve
+        depth = {}
+
+        def update(mode, node):
+            updates[0] += 1
+            depth[node] = 1 + max((depth.get(dep, 0) for dep in graph.dependencies[node]), default=0)
+            computing[0] += 1
+            try:
+                return PriceGraph.update(graph, mode, node)
+            finally:
+                computing[0] -= 1
+
+        def resolve(mode, node):
+            if computing[0]:
+                # a rule reading its (already resolved) dependencies through get_price, not a lookup of its own
+                return PriceGraph.resolve(graph, mode, node)
+            before = updates[0]
+            depth.clear()
+            value = PriceGraph.resolve(graph, mode, node)
+            market_metrics.count('price_cache_hit' if updates[0] == before else 'price_cache_miss')
+            if updates[0] > before:
+                # how many prices a lookup recomputed, and how deep the chain of derived prices it went through was
+                market_metrics.observe('resolve_nodes', updates[0] - before, metrics.SIZE_BUCKETS)
+                market_metrics.observe('resolve_depth', max(depth.values()), metrics.SIZE_BUCKETS)
+            return value
+
+        def resolve_all(mode):
+            before = updates[0]
+            depth.clear()
+            values = PriceGraph.resolve_all(graph, mode)
+            market_metrics.observe('resolve_all_nodes', updates[0] - before, metrics.SIZE_BUCKETS)
+            market_metrics.observe('resolve_all_depth', max(depth.values(), default=0), metrics.SIZE_BUCKETS)
+            return values
+
+        graph.update, graph.resolve, graph.resolve_all = update, resolve, resolve_all
+        market_metrics.gauges['price_graph_updates'] = lambda: updates[0]
+        market_metrics.gauges['dirty_nodes'] = lambda: {mode: int(dirty.sum()) for mode, dirty in graph.dirty.items()}
+        market_metrics.gauges['item_pool'] = lambda: len(Item._pool)
+        market_metrics.gauges['expectation_table_cache'] = lambda: enhance.expectation_table.cache_info()._asdict()
+        self.metrics = market_metrics
+        return market_metrics
+
+    def disable_metrics(self):
+        for name in INSTRUMENTED_METHODS:
+            self.__dict__.pop(name, None)
+        for name in ('update', 'resolve', 'resolve_all'):
+            self.price_graph.__dict__.pop(name, None)
+        self.metrics = None
+
+    def stats(self):
+        return self.metrics.stats() if self.metrics is not None else {}
+
+    def prometheus(self):
+        return self.metrics.prometheus() if self.metrics is not None else ''
 
     def get_loot_price(self, item: Item, mode, force_refresh=False, auto_refresh_time=600):
         assert mode in ('a', 'b')
-        assert item.item_hrid in INIT_CLIENT_DATA['openableLootDropMap']
-        loots = INIT_CLIENT_DATA['openableLootDropMap'][item.item_hrid]
+        assert item.item_hrid in GAME_DATA.client_data['openableLootDropMap']
+        loots = GAME_DATA.client_data['openableLootDropMap'][item.item_hrid]
         value = sum(self.get_price(Item(loot['itemHrid']), mode, force_refresh, auto_refresh_time) * loot['dropRate'] *
                     (loot['minCount'] + loot['maxCount']) / 2
                     for loot in loots if loot['itemHrid'] != '/items/purples_gift')
         if item.item_hrid == '/items/purples_gift':
             value *= 1 / 0.98
-        if item.item_hrid == '/items/chimerical_chest':
-            value -= self.get_price(Item('/items/chimerical_chest_key'), mode, force_refresh, auto_refresh_time)
-        if item.item_hrid == '/items/sinister_chest':
-            value -= self.get_price(Item('/items/sinister_chest_key'), mode, force_refresh, auto_refresh_time)
-        if item.item_hrid == '/items/enchanted_chest':
-            value -= self.get_price(Item('/items/enchanted_chest_key'), mode, force_refresh, auto_refresh_time)
-        if item.item_hrid == '/items/pirate_chest':
-            value -= self.get_price(Item('/items/pirate_chest_key'), mode, force_refresh, auto_refresh_time)
+        if item.item_hrid in CHEST_KEYS:
+            value -= self.get_price(Item(CHEST_KEYS[item.item_hrid]), mode, force_refresh, auto_refresh_time)
         return int(value)
 
     def get_dungeon_token_price(self, item: Item, mode, force_refresh=False, auto_refresh_time=600):
         assert mode in ('a', 'b')
-        shop_item_detail_map = INIT_CLIENT_DATA['shopItemDetailMap']
         max_price = 0
-        for shop_item, detail in shop_item_detail_map.items():
-            if detail['costs'][0]['itemHrid'] != item.item_hrid:
-                continue
-            max_price = max(max_price,
-                            self.get_price(Item(detail['itemHrid']), mode, force_refresh, auto_refresh_time) / detail['costs'][0]['count']
-                            )
+        for shop_item_hrid, count in GAME_DATA.shop_offers.get(item.item_hrid, []):
+            max_price = max(max_price, self.get_price(Item(shop_item_hrid), mode, force_refresh, auto_refresh_time) / count)
         return int(max_price)
 
     def get_task_token_price(self, mode, force_refresh=False, auto_refresh_time=600):
         assert mode in ('a', 'b')
-        return min(
-            self.get_price(Item('/items/large_meteorite_cache'), mode, force_refresh, auto_refresh_time),
-            self.get_price(Item('/items/large_artisans_crate'), mode, force_refresh, auto_refresh_time),
-            self.get_price(Item('/items/large_treasure_chest'), mode, force_refresh, auto_refresh_time),
-        ) // 30
+        return min(self.get_price(Item(crate), mode, force_refresh, auto_refresh_time) for crate in TASK_TOKEN_CRATES) // 30
 
     def get_enhanced_price(self, item: Item, mode, force_refresh=False, auto_refresh_time=600):
         assert mode in ('a', 'b')
@@ -94,64 +383,210 @@ class Market:
             self.get_price(Item(item.item_detail.get('protectionItemHrids', ['/items/mirror_of_protection'])[0]), mode, force_refresh,
                            auto_refresh_time)
         )
-        bonus_rate = 0.05418 + (135.32 - item.item_detail['itemLevel']) * 0.0005 + 0.003
-        bonus_speed = 0.129 + 0.0532 + (135.32 - item.item_detail['itemLevel']) * 0.01 + 0.06 + 0.295 + 0.06774
-        step_time = 12 / (1 + bonus_speed)
-        min_cost = float('inf')
-        for pl in range(min(2, item.enhance_level), item.enhance_level + 1):
-            act = enhance.Action(item.enhance_level, pl, 0.0129, bonus_rate, enhance_cost, protect_cost)
-            total_cost = act.expected_cost + act.expected_steps * step_time * (10_000_000 / 3600)
-            min_cost = min(min_cost, total_cost)
-        return int(min_cost) + self.get_price(Item(item.item_hrid), mode, force_refresh, auto_refresh_time)
+        step_time = self.bonus_profile.step_time(item.item_detail['itemLevel'])
+        table = self.bonus_profile.expectation_table(item.item_detail['itemLevel'])
+        protect_levels = slice(min(2, item.enhance_level), item.enhance_level + 1)
+        steps = table.steps[item.enhance_level, protect_levels]
+        protects = table.protects[item.enhance_level, protect_levels]
+        total_cost = enhance_cost * steps + protect_cost * protects + steps * step_time * self.bonus_profile.time_value
+        return int(total_cost.min()) + self.get_price(Item(item.item_hrid), mode, force_refresh, auto_refresh_time)
 
-    def get_price(self, item: Item, mode, force_refresh=False, auto_refresh_time=600):
-        assert mode in ('a', 'b')
-        if force_refresh or time.time() - self.last_update_time > auto_refresh_time:
-            self.refresh_market_data()
-        if (item, mode) in self.market_cache:
-            return self.market_cache[(item, mode)]
+    def get_dependencies(self, item: Item):
+        """
+        Items whose prices compute_price(item, mode) reads, mirroring its branches.
+        """
+        if item.item_hrid == '/items/coin':
+            return []
+        elif item.item_hrid in GAME_DATA.client_data['openableLootDropMap']:
+            loots = GAME_DATA.client_data['openableLootDropMap'][item.item_hrid]
+            dependencies = [Item(loot['itemHrid']) for loot in loots if loot['itemHrid'] != '/items/purples_gift']
+            if item.item_hrid in CHEST_KEYS:
+                dependencies.append(Item(CHEST_KEYS[item.item_hrid]))
+            return dependencies
+        elif item.item_hrid == '/items/cowbell':
+            # reads the market price of the bag directly, the bag itself is priced as loot of cowbells
+            return []
+        elif item.item_hrid in DUNGEON_TOKENS:
+            return [Item(shop_item_hrid) for shop_item_hrid, count in GAME_DATA.shop_offers.get(item.item_hrid, [])]
+        elif item.item_hrid in BACK_SLOTS:
+            return [Item('/items/mirror_of_protection')] if self.back_slot_price else []
+        elif item.item_hrid in TASK_BADGES:
+            return []
+        elif item.item_hrid == '/items/task_crystal':
+            return [Item('/items/task_token')]
+        elif item.item_hrid == '/items/task_token':
+            return [Item(crate) for crate in TASK_TOKEN_CRATES]
+        elif item.enhance_level > 0 and self.enhance_item_mode in ('force', 'fallback') and item.item_detail.get('enhancementCosts'):
+            return [Item(cost['itemHrid']) for cost in item.item_detail['enhancementCosts']] + [
+                Item(item.item_hrid),
+                Item('/items/mirror_of_protection'),
+                Item(item.item_detail.get('protectionItemHrids', ['/items/mirror_of_protection'])[0]),
+            ]
+        return []
 
+    def compute_price(self, item: Item, mode):
+        # dependencies are already resolved, so nested get_price calls are plain lookups and must never refresh
+        auto_refresh_time = float('inf')
         if item.item_hrid == '/items/coin':
             price = 1
-        elif item.item_hrid in INIT_CLIENT_DATA['openableLootDropMap']:
-            price = self.get_loot_price(item, mode, force_refresh, auto_refresh_time)
+        elif item.item_hrid in GAME_DATA.client_data['openableLootDropMap']:
+            price = self.get_loot_price(item, mode, auto_refresh_time=auto_refresh_time)
         elif item.item_hrid == '/items/cowbell':
             if self.cowbell_price:
-                price = self.get_price(Item('/items/bag_of_10_cowbells'), mode, force_refresh, auto_refresh_time) / 10
+                price = self.get_market_price(Item('/items/bag_of_10_cowbells'), mode)
+                if price == -1:
+                    price = self.default_price_a if mode == 'a' else self.default_price_b
+                price = price / 10
             else:
                 price = 0
-        elif item.item_hrid in ('/items/chimerical_token', '/items/sinister_token', '/items/enchanted_token', '/items/pirate_token'):
-            price = self.get_dungeon_token_price(item, mode, force_refresh, auto_refresh_time)
-        elif item.item_hrid in ('/items/chimerical_quiver', '/items/sinister_cape', '/items/enchanted_cloak'):
+        elif item.item_hrid in DUNGEON_TOKENS:
+            price = self.get_dungeon_token_price(item, mode, auto_refresh_time=auto_refresh_time)
+        elif item.item_hrid in BACK_SLOTS:
             if self.back_slot_price:
-                price = self.get_price(Item('/items/mirror_of_protection'), mode, force_refresh, auto_refresh_time)
+                price = self.get_price(Item('/items/mirror_of_protection'), mode, auto_refresh_time=auto_refresh_time)
             else:
                 price = 0
-        elif item.item_hrid in ('/items/basic_task_badge', '/items/advanced_task_badge', '/items/expert_task_badge'):
+        elif item.item_hrid in TASK_BADGES:
             price = 0
         elif item.item_hrid == '/items/task_crystal':
-            price = 50 * self.get_task_token_price(mode, force_refresh, auto_refresh_time)
+            price = 50 * self.get_task_token_price(mode, auto_refresh_time=auto_refresh_time)
         elif item.item_hrid == '/items/task_token':
-            price = self.get_task_token_price(mode, force_refresh, auto_refresh_time)
-        else:
-            if item.enhance_level > 0 and self.enhance_item_mode in ('force', 'fallback'):
-                if self.enhance_item_mode == 'force':
-                    price = self.get_enhanced_price(item, mode, force_refresh, auto_refresh_time)
-                elif self.enhance_item_mode == 'fallback':
-                    price = self.market_data[item.item_hrid].get(str(item.enhance_level), {}).get(mode, -1)
-                    if price == -1:
-                        price = self.get_enhanced_price(item, mode, force_refresh, auto_refresh_time)
-                        print(f'Warning: {item} {mode} not found, use fallback value: {price}')
-                else:
-                    assert False
-            else:
-                price = self.market_data[item.item_hrid].get(str(item.enhance_level), {}).get(mode, -1)
+            price = self.get_task_token_price(mode, auto_refresh_time=auto_refresh_time)
+        elif item.enhance_level > 0 and self.enhance_item_mode in ('force', 'fallback') and item.item_detail.get('enhancementCosts'):
+            if self.enhance_item_mode == 'force':
+                price = self.get_enhanced_price(item, mode, auto_refresh_time=auto_refresh_time)
+            elif self.enhance_item_mode == 'fallback':
+                price = self.get_market_price(item, mode)
                 if price == -1:
-                    price = self.default_price_a if mode == 'a' else self.default_price_b
-                    print(f'Warning: {item} {mode} not found, use default value: {price}')
+                    price = self.get_enhanced_price(item, mode, auto_refresh_time=auto_refresh_time)
+                    self.event('enhanced_fallback', f'{item} {mode} not found, use fallback value: {price}', item_hrid=item.item_hrid, enhance_level=item.enhance_level, mode=mode, price=price)
+            else:
+                assert False
+        else:
+            price = self.get_market_price(item, mode)
+            if price == -1:
+                price = self.default_price_a if mode == 'a' else self.default_price_b
+                self.event('default_price', f'{item} {mode} not found, use default value: {price}', item_hrid=item.item_hrid, enhance_level=item.enhance_level, mode=mode, price=price)
         # price = min(self.default_price_a, max(self.default_price_b, price))
-        self.market_cache[(item, mode)] = int(price)
-        return self.market_cache[(item, mode)]
+        return int(price)
+
+    def build_price_graph(self):
+        """
+        The dependencies only change with GRAPH_OPTIONS, so they are worked out once per process for each combination
+        and shared : offline copies (at(), price_history()) and option switches back and forth do not redo them.
+        """
+        nodes = item_module.catalog()
+        key = (type(self),) + tuple(getattr(self, name) for name in GRAPH_OPTIONS)
+        graph = PRICE_GRAPHS.get(key)
+        if graph is None:
+            dependencies = [sorted({self.node(dep) for dep in self.get_dependencies(it)}) for it in nodes]
+            leaf_readers = {}
+            if self.cowbell_price:
+                leaf_readers[self.node(Item('/items/bag_of_10_cowbells'))] = [
+                    self.node(Item('/items/cowbell', enhance_level)) for enhance_level in range(item_module.ENHANCE_LEVELS)
+                ]
+            graph = PRICE_GRAPHS[key] = PriceGraph(dependencies, None, leaf_readers)
+        return graph.copy(lambda node, mode: self.compute_price(nodes[node], mode))
+
+    def pricing_options(self):
+        return tuple(getattr(self, name) for name in PRICING_OPTIONS)
+
+    def check_pricing_options(self):
+        """
+        Rebuild the price graph if a pricing option changed since it was built, its dependencies and resolved
+        values are only valid for the options it was built with.
+        """
+        options = self.pricing_options()
+        if options == self.price_graph_options:
+            return
+        self.price_graph = self.build_price_graph()
+        self.price_graph_options = options
+        self.price_vectors = {}
+        if self.market_prices is not None:
+            for mode in ('a', 'b'):
+                self.price_graph.invalidate(mode)
+        if self.metrics is not None:
+            self.enable_metrics(self.metrics)
+
+    @staticmethod
+    def node(item: Item):
+        return item.node
+
+    def get_price(self, item: Item, mode, force_refresh=False, auto_refresh_time=600):
+        assert mode in ('a', 'b')
+        self.auto_refresh(force_refresh, auto_refresh_time)
+        with self.lock:
+            self.check_pricing_options()
+            return int(self.price_graph.resolve(mode, self.node(item)))
+
+    def price_vector(self, mode, force_refresh=False, auto_refresh_time=600):
+        """
+        Every (item_hrid, enhance_level) resolved into an int64 array of shape (len(ITEM_HRIDS), ENHANCE_LEVELS),
+        indexed by Item.index and enhance level. The array is a snapshot, it is rebuilt after each refresh.
+        If some price does not fit in int64 the array is an object array of the exact Python ints instead.
+        """
+        assert mode in ('a', 'b')
+        self.auto_refresh(force_refresh, auto_refresh_time)
+        with self.lock:
+            self.check_pricing_options()
+            if mode not in self.price_vectors:
+                verbose, self.verbose = self.verbose, False
+                try:
+                    values = self.price_graph.resolve_all(mode)
+                finally:
+                    self.verbose = verbose
+                values = values.reshape(-1, item_module.ENHANCE_LEVELS)
+                try:
+                    self.price_vectors[mode] = values.astype(np.int64)
+                except OverflowError:
+                    self.price_vectors[mode] = values.copy()
+            return self.price_vectors[mode]
+
+    def get_prices(self, items, mode, force_refresh=False, auto_refresh_time=600):
+        vector = self.price_vector(mode, force_refresh, auto_refresh_time)
+        items = list(items)
+        indices = np.fromiter((it.index for it in items), dtype=np.intp, count=len(items))
+        enhance_levels = np.fromiter((it.enhance_level for it in items), dtype=np.intp, count=len(items))
+        return vector[indices, enhance_levels]
+
+    def offline_copy(self):
+        market = Market(self.default_price_a, self.default_price_b, self.enhance_item_mode, self.cowbell_price, self.back_slot_price,
+                        url=None, snapshot_path=None, bonus_profile=self.bonus_profile)
+        market.verbose = self.verbose
+        return market
+
+    def at(self, timestamp):
+        """
+        Offline Market priced from the last history snapshot at or before timestamp, with the same pricing options.
+        """
+        assert self.history is not None
+        market_data_time, market_prices = self.history.prices_at(timestamp)
+        market = self.offline_copy()
+        market.load_market_prices(market_prices, market_data_time)
+        market.last_update_time = market_data_time
+        return market
+
+    def price_history(self, items, mode, start=None, end=None):
+        """
+        Prices of items (derived prices included) at every history snapshot in [start, end] :
+        (timestamps, int64 array of shape (snapshots, len(items))), an object array of exact Python ints when some price
+        does not fit in int64, like price_vector.
+        Snapshots are applied to one offline Market in order, so each step only recomputes what changed.
+        """
+        assert self.history is not None and mode in ('a', 'b')
+        items = list(items)
+        market = self.offline_copy()
+        times, rows = [], []
+        for market_data_time, market_prices in self.history.snapshots(start, end):
+            market.load_market_prices(market_prices, market_data_time, market_data={})
+            times.append(market_data_time)
+            rows.append([market.get_price(it, mode) for it in items])
+        prices = np.array(rows, dtype=object).reshape(len(times), len(items))
+        try:
+            prices = prices.astype(np.int64)
+        except OverflowError:
+            pass
+        return np.array(times, dtype=np.int64), prices
 
 
 if __name__ == '__main__':
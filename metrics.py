@@ -0,0 +1,190 @@
+"""
+Counters, timers and histograms for Market and enhance.Action, plus rate-limited warning events.
+
+Instrumentation is attached by wrapping methods, and detaching removes the wrappers again, so a Market without
+metrics runs exactly the uninstrumented code:
+    m = metrics.Metrics()
+    market.enable_metrics(m)      # per-instance : rule branches, market lookups, get_price hits / misses, refreshes
+    metrics.instrument_enhance(m) # process-wide : Action.cost_cdf per method, lattice_pmf cache
+    print(m.prometheus())
+"""
+import bisect
+import functools
+import logging
+import math
+import threading
+import time
+
+import enhance
+
+LOGGER = logging.getLogger('markethandler')
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+SIZE_BUCKETS = (1, 2, 5, 10, 50, 100, 500, 1000, 5000, 20000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def stats(self):
+        return {'buckets': dict(zip(self.buckets + (math.inf,), self.counts)), 'sum': self.sum, 'count': self.count}
+
+
+class Metrics:
+    """
+    counters : name -> count
+    timers : name -> [calls, total seconds]
+    histograms : name -> Histogram
+    gauges : name -> callable, read when stats() is taken
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.timers = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def time(self, name, seconds):
+        with self.lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(buckets)
+            self.histograms[name].observe(value)
+
+    def timed(self, name, function, histogram=False):
+        """
+        Wrap function so every call is counted and timed under name, optionally into a latency histogram too.
+        """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                self.time(name, seconds)
+                if histogram:
+                    self.observe(f'{name}_seconds', seconds)
+
+        return wrapper
+
+    def stats(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'timers': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in self.timers.items()},
+                'histograms': {name: histogram.stats() for name, histogram in self.histograms.items()},
+                'gauges': {name: gauge() for name, gauge in self.gauges.items()},
+            }
+
+    def prometheus(self, prefix='markethandler'):
+        """
+        stats() in the Prometheus text exposition format.
+        """
+        stats = self.stats()
+        lines = [f'# TYPE {prefix}_counter_total counter']
+        lines += [f'{prefix}_counter_total{{name="{name}"}} {value}' for name, value in sorted(stats['counters'].items())]
+        lines.append(f'# TYPE {prefix}_calls_total counter')
+        lines += [f'{prefix}_calls_total{{name="{name}"}} {timer["calls"]}' for name, timer in sorted(stats['timers'].items())]
+        lines.append(f'# TYPE {prefix}_seconds_total counter')
+        lines += [f'{prefix}_seconds_total{{name="{name}"}} {timer["seconds"]:.9g}' for name, timer in sorted(stats['timers'].items())]
+        for name, histogram in sorted(stats['histograms'].items()):
+            lines.append(f'# TYPE {prefix}_{name} histogram')
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                le = '+Inf' if bound == math.inf else f'{bound:g}'
+                lines.append(f'{prefix}_{name}_bucket{{le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_{name}_sum {histogram["sum"]:.9g}')
+            lines.append(f'{prefix}_{name}_count {histogram["count"]}')
+        lines.append(f'# TYPE {prefix}_gauge gauge')
+        for name, value in sorted(stats['gauges'].items()):
+            if isinstance(value, dict):
+                lines += [f'{prefix}_gauge{{name="{name}",field="{field}"}} {v}' for field, v in sorted(value.items())]
+            else:
+                lines.append(f'{prefix}_gauge{{name="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class EventLimiter:
+    """
+    Logs at most `burst` events of each kind per `interval` seconds, the number suppressed in between
+    is attached to the next event of that kind that gets through.
+    """
+
+    def __init__(self, burst=10, interval=60.0, logger=LOGGER):
+        self.burst = burst
+        self.interval = interval
+        self.logger = logger
+        self.windows = {}
+
+    def emit(self, kind, message, **fields):
+        now = time.monotonic()
+        start, sent, suppressed = self.windows.get(kind, (now, 0, 0))
+        if now - start >= self.interval:
+            start, sent = now, 0
+        if sent >= self.burst:
+            self.windows[kind] = (start, sent, suppressed + 1)
+            return False
+        self.windows[kind] = (start, sent + 1, 0)
+        if suppressed:
+            message = f'{message} ({suppressed} similar events suppressed)'
+        self.logger.warning(message, extra={'event': kind, 'fields': fields, 'suppressed': suppressed})
+        return True
+
+
+def instrument_enhance(metrics):
+    """
+    Time enhance.Action.cost_cdf per method and count lattice_pmf cache hits / misses, for every Action in the process.
+    """
+    uninstrument_enhance()
+    cost_cdf = enhance.Action.cost_cdf
+    lattice_pmf = enhance.Action.lattice_pmf
+
+    @functools.wraps(cost_cdf)
+    def timed_cost_cdf(self, steps, *args, **kwargs):
+        method = kwargs.get('method', args[1] if len(args) > 1 else 'DP')
+        start = time.perf_counter()
+        try:
+            return cost_cdf(self, steps, *args, **kwargs)
+        finally:
+            metrics.time(f'cost_cdf_{method}', time.perf_counter() - start)
+
+    @functools.wraps(lattice_pmf)
+    def counted_lattice_pmf(self, *args, **kwargs):
+        cached = len(self.lattice_pmf_cache)
+        result = lattice_pmf(self, *args, **kwargs)
+        metrics.count('lattice_pmf_miss' if len(self.lattice_pmf_cache) > cached else 'lattice_pmf_hit')
+        return result
+
+    timed_cost_cdf.uninstrumented = cost_cdf
+    counted_lattice_pmf.uninstrumented = lattice_pmf
+    enhance.Action.cost_cdf = timed_cost_cdf
+    enhance.Action.lattice_pmf = counted_lattice_pmf
+    metrics.gauges['expectation_table_cache'] = lambda: enhance.expectation_table.cache_info()._asdict()
+
+
+def uninstrument_enhance():
+    for name in ('cost_cdf', 'lattice_pmf'):
+        method = getattr(enhance.Action, name)
+        if hasattr(method, 'uninstrumented'):
+            setattr(enhance.Action, name, method.uninstrumented)
@@ -0,0 +1,120 @@
+"""
+Order book depth, for valuing a position at what selling it would actually raise instead of count * top-of-book.
+
+Snapshot format, the game's per-item order books keyed by item hrid, with one book per enhance level:
+    {"timestamp": 1750000000,
+     "orderBooks": {"/items/milk": [{"asks": [{"price": 8, "quantity": 1200}, ...],
+                                     "bids": [{"price": 7, "quantity": 900}, ...]},   # +0
+                                    ...]}}                                             # +1, +2 ...
+Extra fields on a level (listingId, ...) are ignored. Only the bids are read : the value of a holding is what selling it
+into them raises, which is never more than count * top bid. The asks (what buying it back would cost) do not bound
+that from above, so they are left out.
+"""
+import json
+
+import numpy as np
+import requests
+
+import item as item_module
+
+
+class OrderBooks:
+    """
+    Every bid level of every book flattened best price first and grouped by node (Item.node), CSR style:
+        offsets[node]:offsets[node + 1]   levels of that node
+        price, quantity
+        cumulative_quantity               cumulative over the whole array, so one searchsorted serves every node
+        value_before                      value of the better levels of the same node, restarting at each node
+    Values are int64, or exact Python ints (object arrays) when the books are worth more than int64 can hold.
+    """
+
+    def __init__(self, books, timestamp=None):
+        self.timestamp = timestamp
+        size = len(item_module.ITEM_HRIDS) * item_module.ENHANCE_LEVELS
+        levels = [[] for _ in range(size)]
+        for item_hrid, item_books in books.items():
+            if item_hrid not in item_module.ITEM_INDEX:
+                continue
+            for enhance_level, book in enumerate(item_books[:item_module.ENHANCE_LEVELS]):
+                node = item_module.ITEM_INDEX[item_hrid] * item_module.ENHANCE_LEVELS + enhance_level
+                levels[node] = sorted(((entry['price'], entry['quantity']) for entry in (book or {}).get('bids') or [] if entry['quantity'] > 0),
+                                      reverse=True)
+        self.offsets = np.zeros(size + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(node_levels) for node_levels in levels])
+        self.price = np.array([p for node_levels in levels for p, _ in node_levels], dtype=np.int64)
+        self.quantity = np.array([q for node_levels in levels for _, q in node_levels], dtype=np.int64)
+        self.cumulative_quantity = np.cumsum(self.quantity)
+        value = self.price * self.quantity
+        if (self.price.astype(np.float64) * self.quantity).sum() >= 2 ** 62:
+            value = self.price.astype(object) * self.quantity.astype(object)
+        total = np.cumsum(value)
+        node_start = np.repeat(self.offsets[:-1], np.diff(self.offsets))
+        self.value_before = total - value - np.where(node_start > 0, total[node_start - 1], 0)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot['orderBooks'], snapshot.get('timestamp'))
+
+    @classmethod
+    def load(cls, source, timeout=30):
+        """
+        Snapshot from a local file or an http(s) url serving the same format.
+        """
+        if source.startswith(('http://', 'https://')):
+            response = requests.get(source, timeout=timeout)
+            response.raise_for_status()
+            return cls.from_snapshot(response.json())
+        with open(source, encoding='utf-8') as f:
+            return cls.from_snapshot(json.load(f))
+
+    def depth(self, nodes):
+        """
+        Total bid quantity of each node.
+        """
+        nodes = np.asarray(nodes, dtype=np.intp)
+        if not len(self.quantity):
+            return np.zeros(len(nodes), dtype=np.int64)
+        start, end = self.offsets[nodes], self.offsets[nodes + 1]
+        before = np.where(start > 0, self.cumulative_quantity[start - 1], 0)
+        return np.where(end > start, self.cumulative_quantity[np.maximum(end - 1, 0)] - before, 0)
+
+    def value(self, nodes, counts, fallback_prices, beyond_depth='zero'):
+        """
+        Executable value of selling counts[i] units of nodes[i] into the bids.
+        Nodes without bids are valued at count * fallback_prices[node] (a flat price vector, e.g. Market.price_vector(mode).ravel()).
+        Units beyond the book's depth are valued at nothing ('zero'), since no bid is there to take them, or at the
+        lowest bid ('last'), which overstates what they would raise.
+        O(log levels) per position : one searchsorted into the cumulative depth for the whole batch.
+        int64 unless some value could leave its range, then an object array of exact Python ints.
+        """
+        assert beyond_depth in ('last', 'zero')
+        price, quantity, cumulative_quantity, value_before = self.price, self.quantity, self.cumulative_quantity, self.value_before
+        nodes = np.asarray(nodes, dtype=np.intp)
+        counts = np.asarray(counts, dtype=np.int64)
+        fallback_prices = np.asarray(fallback_prices)[nodes]
+        start, end = self.offsets[nodes], self.offsets[nodes + 1]
+        listed = end > start
+        # no value exceeds count * max(top bid, fallback price)
+        top = np.where(listed, price[np.minimum(start, len(price) - 1)], 0) if len(price) else 0
+        estimate = counts * np.maximum(top, np.abs(fallback_prices.astype(np.float64)))
+        if fallback_prices.dtype == object or value_before.dtype == object or estimate.max(initial=0) >= 2 ** 62:
+            # every operand as Python ints, numpy scalars would still wrap when mixed in
+            counts, fallback_prices, price, quantity, value_before = (
+                array.astype(object) for array in (counts, fallback_prices, price, quantity, value_before))
+            cumulative = cumulative_quantity.astype(object)
+        else:
+            cumulative = cumulative_quantity
+        fallback = counts * fallback_prices
+        if not len(price):
+            return fallback
+        last = np.maximum(end - 1, 0)
+        before = np.where(start > 0, cumulative[start - 1], 0)
+        fill = np.where(listed, np.minimum(counts, cumulative[last] - before), 0)
+        target = before + fill
+        # first level whose cumulative depth covers the order, inside the node's own levels whenever fill > 0
+        level = np.minimum(np.searchsorted(cumulative_quantity, target.astype(np.int64), side='left'), last)
+        filled = cumulative[level] - quantity[level]
+        values = np.where(fill > 0, value_before[level] + (target - filled) * price[level], 0)
+        if beyond_depth == 'last':
+            values = values + (counts - fill) * price[last]
+        return np.where(listed, values, fallback)
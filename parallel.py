@@ -0,0 +1,206 @@
+"""
+Multi-core valuation. The parent process owns the Market and publishes its resolved price vectors into shared memory,
+pool workers attach to them zero-copy and run networth or cost_cdf jobs.
+Game data reaches the workers through the memory-mapped game_data snapshot, so they share those pages as well.
+"""
+import json
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import enhance
+import item as item_module
+import tools
+
+
+class SharedPrices:
+    """
+    a/b price vectors in a shared memory block, laid out as an int64 header [started generation, published generation]
+    followed by two slots of shape (2, len(ITEM_HRIDS), ENHANCE_LEVELS). Generation g lives in slot g % 2.
+    publish() announces the next generation, writes its slot and then publishes it.
+
+    Jobs read through view(), pinned to one published generation for both modes. Its slot is only written again by the
+    publish two generations later, so a job retries (run) when that publish has started while it was reading.
+    """
+    HEADER = 2
+
+    def __init__(self, name=None):
+        shape = (2, 2, len(item_module.ITEM_HRIDS), item_module.ENHANCE_LEVELS)
+        size = 8 * (SharedPrices.HEADER + math.prod(shape))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            # pool workers share the parent's resource tracker, so attaching does not add a second owner
+            self.shm = shared_memory.SharedMemory(name=name)
+        buffer = np.ndarray((size // 8,), dtype=np.int64, buffer=self.shm.buf)
+        self.header = buffer[:SharedPrices.HEADER]
+        self.slots = buffer[SharedPrices.HEADER:].reshape(shape)
+        if self.owner:
+            buffer[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def generation(self):
+        return int(self.header[1])
+
+    def publish(self, market):
+        """
+        The slots are int64 : a market with some price beyond int64 (Market.price_vector falls back to an object array)
+        raises OverflowError before anything is written, and the published generation stays the current one.
+        """
+        vectors = market.price_vector('a'), market.price_vector('b')
+        if any(vector.dtype == object for vector in vectors):
+            raise OverflowError('prices beyond the int64 range cannot be published to shared memory, '
+                                'value these players in process with tools.networth_batch(market, players)')
+        generation = self.generation + 1
+        self.header[0] = generation
+        self.slots[generation % 2, 0] = vectors[0]
+        self.slots[generation % 2, 1] = vectors[1]
+        self.header[1] = generation
+
+    def view(self):
+        return PricesView(self, self.generation)
+
+    def run(self, function, *args):
+        """
+        function(view, *args) over one consistent generation, called again if that generation was overwritten meanwhile.
+        """
+        while True:
+            view = self.view()
+            result = function(view, *args)
+            if not view.stale():
+                return result
+
+    def price_vector(self, mode, force_refresh=False, auto_refresh_time=600):
+        return self.view().price_vector(mode)
+
+    def get_price(self, item, mode, force_refresh=False, auto_refresh_time=600):
+        return self.view().get_price(item, mode)
+
+    def get_prices(self, items, mode, force_refresh=False, auto_refresh_time=600):
+        return self.view().get_prices(items, mode)
+
+    def close(self):
+        del self.header, self.slots
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class PricesView:
+    """
+    One generation of SharedPrices. Implements price_vector / get_price / get_prices like Market, so
+    tools.networth_batch and tools.get_player_networth accept it in place of a Market.
+    """
+
+    def __init__(self, prices, generation):
+        self.prices = prices
+        self.generation = generation
+        self.slot = prices.slots[generation % 2]
+
+    def stale(self):
+        return int(self.prices.header[0]) - self.generation >= 2
+
+    def price_vector(self, mode, force_refresh=False, auto_refresh_time=600):
+        assert mode in ('a', 'b')
+        return self.slot[0 if mode == 'a' else 1]
+
+    def get_price(self, item, mode, force_refresh=False, auto_refresh_time=600):
+        return int(self.price_vector(mode)[item.index, item.enhance_level])
+
+    def get_prices(self, items, mode, force_refresh=False, auto_refresh_time=600):
+        vector = self.price_vector(mode)
+        items = list(items)
+        indices = np.fromiter((it.index for it in items), dtype=np.intp, count=len(items))
+        enhance_levels = np.fromiter((it.enhance_level for it in items), dtype=np.intp, count=len(items))
+        return vector[indices, enhance_levels]
+
+
+_PRICES = None
+
+
+def _attach(name):
+    global _PRICES
+    _PRICES = SharedPrices(name)
+
+
+def _networth_job(players):
+    return _PRICES.run(tools.networth_batch, players)
+
+
+def _networth_files_job(paths):
+    players = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            players.append(json.load(f))
+    return _PRICES.run(tools.networth_batch, players)
+
+
+def _cost_cdf_job(job):
+    action_args, steps, kwargs = job
+    return enhance.Action(*action_args).cost_cdf(steps, **kwargs)
+
+
+class ValuationPool:
+    """
+    with ValuationPool(market, processes=8) as pool:
+        networth = pool.networth(players)
+        ...
+        market.refresh_market_data()
+        pool.publish(market)
+    """
+
+    def __init__(self, market=None, processes=None):
+        self.prices = SharedPrices()
+        if market is not None:
+            self.publish(market)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.processes, initializer=_attach, initargs=(self.prices.name,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def publish(self, market):
+        self.prices.publish(market)
+
+    def networth(self, players, chunk_size=None):
+        """
+        tools.networth_batch over the published prices, with players split into chunks across the workers.
+        """
+        return self.map_chunks(_networth_job, list(players), chunk_size)
+
+    def networth_files(self, paths, chunk_size=None):
+        """
+        Like networth, but workers read the player export JSON files themselves,
+        so only paths cross the process boundary instead of pickled player dicts.
+        """
+        return self.map_chunks(_networth_files_job, list(paths), chunk_size)
+
+    def map_chunks(self, job, inputs, chunk_size):
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(inputs) / (4 * self.processes)))
+        parts = self.pool.map(job, [inputs[i:i + chunk_size] for i in range(0, len(inputs), chunk_size)])
+        return {
+            category: {mode: np.concatenate([part[category][mode] for part in parts] or [np.zeros(0, dtype=np.int64)]) for mode in ('a', 'b')}
+            for category in tools.NETWORTH_CATEGORIES
+        }
+
+    def cost_cdfs(self, jobs):
+        """
+        jobs : [(Action args tuple, steps, cost_cdf kwargs dict)], returns [(xs, ys)] in the same order
+        """
+        return self.pool.map(_cost_cdf_job, jobs, chunksize=1)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.prices.close()
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+class PriceGraph:
+    """
+    Dependency graph of price nodes, solved in topological order.
+
+    dependencies[node] lists the nodes whose prices `compute(node, mode)` reads, leaf_readers[leaf] lists the
+    nodes (besides the leaf's own node) that read a raw market price directly.
+    Values are kept per mode as Python ints (object arrays, prices of high enhance levels can outgrow int64),
+    and only the nodes downstream of an invalidated node are recomputed.
+    """
+
+    def __init__(self, dependencies, compute, leaf_readers=None):
+        self.size = len(dependencies)
+        self.dependencies = dependencies
+        self.dependents = [[] for _ in range(self.size)]
+        for node, deps in enumerate(dependencies):
+            for dep in deps:
+                self.dependents[dep].append(node)
+        self.leaf_readers = leaf_readers or {}
+        self.compute = compute
+        self.order = self.topological_order()
+        self.rank = np.empty(self.size, dtype=np.intp)
+        self.rank[self.order] = np.arange(self.size)
+        self.values = {}
+        self.dirty = {}
+
+    def copy(self, compute):
+        """
+        A graph over the same nodes and dependencies that prices them with another compute, with no values yet.
+        """
+        graph = PriceGraph.__new__(PriceGraph)
+        graph.size, graph.dependencies, graph.dependents, graph.leaf_readers = self.size, self.dependencies, self.dependents, self.leaf_readers
+        graph.order, graph.rank = self.order, self.rank
+        graph.compute = compute
+        graph.values = {}
+        graph.dirty = {}
+        return graph
+
+    def topological_order(self):
+        in_degree = np.array([len(deps) for deps in self.dependencies], dtype=np.intp)
+        order = list(np.flatnonzero(in_degree == 0))
+        for node in order:
+            for dependent in self.dependents[node]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    order.append(dependent)
+        if len(order) != self.size:
+            raise ValueError(f'price dependencies contain a cycle through {self.size - len(order)} nodes')
+        return np.array(order, dtype=np.intp)
+
+    def invalidate(self, mode, leaves=None):
+        """
+        Mark the nodes of changed market prices and everything downstream of them dirty.
+        leaves=None invalidates the whole graph.
+        """
+        if mode not in self.values or leaves is None:
+            self.values[mode] = np.zeros(self.size, dtype=object)
+            self.dirty[mode] = np.ones(self.size, dtype=bool)
+            return self.size
+        dirty = self.dirty[mode]
+        stack = []
+        for leaf in leaves:
+            stack.append(leaf)
+            stack.extend(self.leaf_readers.get(leaf, ()))
+        count = 0
+        while stack:
+            node = stack.pop()
+            if dirty[node]:
+                continue
+            dirty[node] = True
+            count += 1
+            stack.extend(self.dependents[node])
+        return count
+
+    def resolve(self, mode, node):
+        dirty = self.dirty[mode]
+        if not dirty[node]:
+            return self.values[mode][node]
+        pending = {node}
+        stack = [node]
+        while stack:
+            for dep in self.dependencies[stack.pop()]:
+                if dirty[dep] and dep not in pending:
+                    pending.add(dep)
+                    stack.append(dep)
+        for pending_node in sorted(pending, key=self.rank.__getitem__):
+            self.update(mode, pending_node)
+        return self.values[mode][node]
+
+    def resolve_all(self, mode):
+        dirty = self.dirty[mode]
+        for node in self.order[dirty[self.order]]:
+            if dirty[node]:
+                self.update(mode, node)
+        return self.values[mode]
+
+    def update(self, mode, node):
+        self.values[mode][node] = self.compute(node, mode)
+        self.dirty[mode][node] = False
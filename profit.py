@@ -0,0 +1,115 @@
+"""
+Coin per hour of every gathering and production action in actionDetailMap, priced by a Market.
+
+Inputs and outputs are kept as (action, item, count) entry lists, so a scan is one np.bincount over a few thousand
+entries per mode, and a refresh only re-sums the actions that use an item whose price changed.
+"""
+import numpy as np
+
+from game_data import GAME_DATA
+
+MODES = ('a', 'b')
+
+
+def expand_rows(offsets):
+    """
+    Row id of every entry of a CSR table.
+    """
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+class ProfitScanner:
+    """
+    market : anything with price_vector(mode), usually a Market
+    speed, efficiency : bonus ratios (0.1 for +10%), either one float for every action or a dict keyed by
+        action type hrid ('/action_types/cheesesmithing'), missing types get 0
+    levels : skill hrid -> level, each level above an action's requirement adds 1% efficiency
+
+    An action takes baseTimeCost / (1 + speed), and efficiency repeats it (inputs included) 1 + efficiency times
+    on average. Inputs are bought and outputs sold at the same mode's price, drop tables count at their expected value.
+    """
+
+    def __init__(self, market, speed=0.0, efficiency=0.0, levels=None):
+        self.market = market
+        self.action_hrids = GAME_DATA.action_hrids
+        action_detail_map = GAME_DATA.client_data['actionDetailMap']
+        self.action_types = [action_detail_map[action_hrid]['type'] for action_hrid in self.action_hrids]
+        self.skills = [action_detail_map[action_hrid]['levelRequirement']['skillHrid'] for action_hrid in self.action_hrids]
+        self.entry_action = np.concatenate([expand_rows(GAME_DATA.action_output_offsets), expand_rows(GAME_DATA.action_input_offsets)])
+        self.entry_item = np.concatenate([GAME_DATA.action_output_item, GAME_DATA.action_input_item])
+        self.entry_count = np.concatenate([GAME_DATA.action_output_count, -GAME_DATA.action_input_count.astype(np.float64)])
+        self.order = np.argsort(self.entry_item, kind='stable')
+        self.item_offsets = np.searchsorted(self.entry_item[self.order], np.arange(len(GAME_DATA.item_hrids) + 1))
+        self.set_bonuses(speed, efficiency, levels)
+        self.prices = {}
+        self.profit = {}
+        self.rankings = {}
+
+    def bonus(self, value):
+        if isinstance(value, dict):
+            return np.array([value.get(action_type, 0.0) for action_type in self.action_types], dtype=np.float64)
+        return np.full(len(self.action_hrids), value, dtype=np.float64)
+
+    def set_bonuses(self, speed=0.0, efficiency=0.0, levels=None):
+        """
+        Recompute actions per hour. Prices and per-action profit are untouched, only rankings are rebuilt.
+        """
+        efficiency = self.bonus(efficiency)
+        if levels:
+            level = np.array([levels.get(skill, 0) for skill in self.skills], dtype=np.int64)
+            efficiency += np.maximum(level - GAME_DATA.action_level_requirement, 0) / 100
+        seconds = GAME_DATA.action_time_cost / 1e9 / (1 + self.bonus(speed))
+        self.actions_per_hour = 3600 / seconds * (1 + efficiency)
+        self.rankings = {}
+
+    def scan(self, force_refresh=False, auto_refresh_time=600):
+        """
+        Price every action from scratch, for both modes.
+        """
+        for mode in MODES:
+            prices = self.market.price_vector(mode, force_refresh, auto_refresh_time)[:, 0].astype(np.float64)
+            self.prices[mode] = prices
+            self.profit[mode] = np.bincount(self.entry_action, weights=self.entry_count * prices[self.entry_item],
+                                            minlength=len(self.action_hrids))
+        self.rankings = {}
+
+    def refresh(self, force_refresh=False, auto_refresh_time=600):
+        """
+        Re-read the market prices and update only the actions that use an item whose price changed.
+        Returns {mode: indices of the affected actions}.
+        """
+        if not self.profit:
+            self.scan(force_refresh, auto_refresh_time)
+            return {mode: np.arange(len(self.action_hrids)) for mode in MODES}
+        affected = {}
+        for mode in MODES:
+            prices = self.market.price_vector(mode, force_refresh, auto_refresh_time)[:, 0].astype(np.float64)
+            changed = np.flatnonzero(prices != self.prices[mode])
+            entries = self.order[np.concatenate([np.arange(self.item_offsets[i], self.item_offsets[i + 1]) for i in changed] or [np.zeros(0, dtype=np.intp)])]
+            affected[mode] = np.unique(self.entry_action[entries])
+            # re-sum the affected actions over all their entries in scan order, so the result matches a full scan exactly
+            entries = np.flatnonzero(np.isin(self.entry_action, affected[mode]))
+            profit = np.bincount(self.entry_action[entries], weights=self.entry_count[entries] * prices[self.entry_item[entries]],
+                                 minlength=len(self.action_hrids))
+            self.profit[mode][affected[mode]] = profit[affected[mode]]
+            self.prices[mode] = prices
+            if len(affected[mode]) and mode in self.rankings:
+                # ties by action index, like the stable argsort of ranking(), so the order matches a full scan
+                order = self.rankings[mode]
+                self.rankings[mode] = order[np.lexsort((order, -self.coin_per_hour(mode)[order]))]
+        return affected
+
+    def coin_per_hour(self, mode):
+        assert mode in MODES
+        if not self.profit:
+            self.scan()
+        return self.profit[mode] * self.actions_per_hour
+
+    def ranking(self, mode, top=None):
+        """
+        [(action hrid, coin per hour)] from the most profitable action down.
+        """
+        coin_per_hour = self.coin_per_hour(mode)
+        if mode not in self.rankings:
+            self.rankings[mode] = np.argsort(-coin_per_hour, kind='stable')
+        return [(self.action_hrids[index], float(coin_per_hour[index])) for index in self.rankings[mode][:top].tolist()]
@@ -0,0 +1,149 @@
+"""
+Monte Carlo cost distribution of an enhance.Action, for quantiles where an exact cost_cdf would be expensive.
+
+Each chain records its number of attempts and of protects used, its cost is steps * enhance_cost + protects * protect_cost
+(the two values of Action.H), so one simulation prices any pair of costs.
+
+Chains advance block_steps attempts per draw: block_table holds the exact joint distribution of
+(level after block_steps attempts, protects used) plus (attempt at which the target was reached, protects used),
+built from Action.Q / Action.R and Action.H_protect. One np.searchsorted per chain per block replaces block_steps
+single-attempt draws, so long chains (+12 and up take thousands of attempts) stay cheap.
+
+Batch i always draws from SeedSequence(seed).spawn(...)[i], so results do not depend on the number of processes.
+"""
+import functools
+import math
+import multiprocessing
+from statistics import NormalDist
+
+import numpy as np
+
+import enhance
+
+
+@functools.lru_cache(maxsize=32)
+def block_table(target_level, protect_level, bless, bonus_rate, block_steps):
+    """
+    Cumulative outcome probabilities, one row per starting level, offset by the row number so a whole batch can be
+    sampled with a single searchsorted of level + u. Outcomes of a row, (block_steps + 1) protect counts each :
+        level * (block_steps + 1) + protects                     still below target after block_steps attempts
+        (target_level + step - 1) * (block_steps + 1) + protects  target reached at attempt step (1..block_steps)
+    """
+    act = enhance.Action(target_level, protect_level, bless, bonus_rate)
+    levels = target_level
+    width = block_steps + 1
+    protected = act.H_protect[:-1, :-1] > 0
+    q_plain = np.where(protected, 0.0, act.Q)
+    q_protect = np.where(protected, act.Q, 0.0)
+    # d[start, level, protects] : below target after `step` attempts
+    d = np.zeros((levels, levels, width))
+    d[:, :, 0] = np.eye(levels)
+    absorbed = np.zeros((levels, block_steps, width))
+    for step in range(block_steps):
+        absorbed[:, step, :] = np.einsum('slm,l->sm', d, act.R)
+        moved = np.einsum('slm,lk->skm', d, q_plain)
+        moved[:, :, 1:] += np.einsum('slm,lk->skm', d[:, :, :-1], q_protect)
+        d = moved
+    outcomes = np.concatenate([d.reshape(levels, -1), absorbed.reshape(levels, -1)], axis=1)
+    cumulative = np.cumsum(outcomes, axis=1)
+    cumulative /= cumulative[:, -1:]
+    cumulative += np.arange(levels)[:, None]
+    cumulative.flags.writeable = False
+    return cumulative.reshape(-1)
+
+
+def simulate_chains(act, trials, rng, block_steps=128):
+    """
+    Attempts and protects of `trials` independent chains from +0 to act.target_level, as two int64 arrays.
+    """
+    table = block_table(act.target_level, act.protect_level, act.bless, act.bonus_rate, block_steps)
+    width = block_steps + 1
+    row = act.target_level * width + block_steps * width
+    steps = np.zeros(trials, dtype=np.int64)
+    protects = np.zeros(trials, dtype=np.int64)
+    active = np.arange(trials)
+    level = np.zeros(trials, dtype=np.int64)
+    while len(active):
+        outcome = np.searchsorted(table, level + rng.random(len(active)), side='right')
+        outcome = np.minimum(outcome, (level + 1) * row - 1) - level * row
+        kind, used = np.divmod(outcome, width)
+        protects[active] += used
+        done = kind >= act.target_level
+        steps[active] += np.where(done, kind - act.target_level + 1, block_steps)
+        active = active[~done]
+        level = kind[~done]
+    return steps, protects
+
+
+def _simulate_batch(job):
+    act, trials, seed, block_steps = job
+    return simulate_chains(act, trials, np.random.default_rng(seed), block_steps)
+
+
+class MonteCarlo:
+    """
+    mc = MonteCarlo(enhance.Action(12, 8, 0.0129, 0.1, enhance_cost, protect_cost), seed=1)
+    estimate, low, high = mc.run_until(0.95, rel_tol=0.005)
+    """
+
+    def __init__(self, act, seed=None, batch_size=1_000_000, processes=None, block_steps=128):
+        self.act = act
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.batch_size = batch_size
+        self.processes = processes
+        self.block_steps = block_steps
+        self.steps = np.zeros(0, dtype=np.int64)
+        self.protects = np.zeros(0, dtype=np.int64)
+        self.sorted_costs = None
+
+    def __len__(self):
+        return len(self.steps)
+
+    def run(self, batches=1):
+        """
+        Simulate `batches` more batches of batch_size chains, over a process pool when processes is set.
+        """
+        jobs = [(self.act, self.batch_size, seed, self.block_steps) for seed in self.seed_sequence.spawn(batches)]
+        if self.processes and batches > 1:
+            with multiprocessing.Pool(min(self.processes, batches)) as pool:
+                results = pool.map(_simulate_batch, jobs, chunksize=1)
+        else:
+            results = [_simulate_batch(job) for job in jobs]
+        self.steps = np.concatenate([self.steps] + [steps for steps, _ in results])
+        self.protects = np.concatenate([self.protects] + [protects for _, protects in results])
+        self.sorted_costs = None
+
+    def costs(self):
+        return self.steps * self.act.enhance_cost + self.protects * self.act.protect_cost
+
+    def quantile(self, q, confidence=0.95):
+        """
+        (estimate, low, high) of the q-quantile of the cost. The interval comes from order statistics
+        (normal approximation of the binomial rank), so it holds for any cost distribution.
+        """
+        if self.sorted_costs is None:
+            self.sorted_costs = np.sort(self.costs())
+        n = len(self.sorted_costs)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        spread = z * math.sqrt(n * q * (1 - q))
+        estimate = min(max(math.ceil(n * q) - 1, 0), n - 1)
+        low = min(max(math.floor(n * q - spread) - 1, 0), n - 1)
+        high = min(max(math.ceil(n * q + spread) - 1, 0), n - 1)
+        return tuple(float(self.sorted_costs[rank]) for rank in (estimate, low, high))
+
+    def estimates(self, qs, confidence=0.95):
+        """
+        Run batches forever, yielding (chains so far, {q: (estimate, low, high)}) after each one.
+        """
+        while True:
+            self.run(max(1, self.processes or 1))
+            yield len(self), {q: self.quantile(q, confidence) for q in qs}
+
+    def run_until(self, q, rel_tol=0.01, confidence=0.95, max_chains=100_000_000):
+        """
+        Add batches until the confidence interval of the q-quantile is within rel_tol of the estimate.
+        """
+        for chains, result in self.estimates([q], confidence):
+            estimate, low, high = result[q]
+            if high - low <= rel_tol * estimate or chains >= max_chains:
+                return estimate, low, high
@@ -0,0 +1,86 @@
+"""
+Cheapest way to enhance every enhanceable item to every target level.
+
+One enhance.expectation_table per distinct itemLevel covers all targets and protect levels of every item at that
+level, so a full sweep is a handful of tables plus one vectorized argmin over
+(item, target level, protect level, protection item).
+"""
+from collections import namedtuple
+
+import numpy as np
+
+import enhance
+import item as item_module
+from game_data import GAME_DATA
+
+MIRROR_OF_PROTECTION = '/items/mirror_of_protection'
+
+Strategy = namedtuple('Strategy', ['item_hrid', 'target_level', 'protect_level', 'protection_item_hrid',
+                                   'expected_cost', 'steps', 'protects', 'exp'])
+
+
+def protection_candidates(item_hrid):
+    """
+    Items that can be consumed as protection : the item itself, the mirror and every protectionItemHrids entry.
+    """
+    candidates = [item_hrid, MIRROR_OF_PROTECTION]
+    for protection_hrid in GAME_DATA.client_data['itemDetailMap'][item_hrid].get('protectionItemHrids') or []:
+        if protection_hrid not in candidates:
+            candidates.append(protection_hrid)
+    return candidates
+
+
+def optimize(market, mode, profile=enhance.DEFAULT_PROFILE, item_hrids=None, force_refresh=False, auto_refresh_time=600):
+    """
+    [Strategy] for every enhanceable item (or item_hrids) and target level 1..MAX_LEVEL, minimizing
+        enhance_cost * steps + protect_cost * protects + steps * step_time * time_value
+    over protect levels min(2, target)..target and protection items, the same objective as Market.get_enhanced_price
+    (which adds the base item price on top). protect_level == target_level means no protection,
+    protection_item_hrid is None then.
+    """
+    assert mode in ('a', 'b')
+    item_detail_map = GAME_DATA.client_data['itemDetailMap']
+    if item_hrids is None:
+        item_hrids = [item_hrid for item_hrid in GAME_DATA.item_hrids if item_detail_map[item_hrid].get('enhancementCosts')]
+    prices = market.price_vector(mode, force_refresh, auto_refresh_time)[:, 0]
+    levels = enhance.MAX_LEVEL + 1
+
+    candidates = [protection_candidates(item_hrid) for item_hrid in item_hrids]
+    width = max((len(row) for row in candidates), default=1)
+    protect_price = np.zeros((len(item_hrids), width))
+    padding = np.ones((len(item_hrids), width), dtype=bool)
+    for row, hrids in enumerate(candidates):
+        protect_price[row, :len(hrids)] = prices[[item_module.ITEM_INDEX[hrid] for hrid in hrids]]
+        padding[row, :len(hrids)] = False
+    enhance_cost = np.array([
+        sum(int(prices[item_module.ITEM_INDEX[cost['itemHrid']]]) * cost['count'] for cost in item_detail_map[item_hrid]['enhancementCosts'])
+        for item_hrid in item_hrids], dtype=np.float64)
+
+    item_levels = [item_detail_map[item_hrid]['itemLevel'] for item_hrid in item_hrids]
+    tables = {item_level: profile.expectation_table(item_level) for item_level in set(item_levels)}
+    steps = np.stack([tables[item_level].steps for item_level in item_levels])
+    protects = np.stack([tables[item_level].protects for item_level in item_levels])
+    exp = np.stack([tables[item_level].exp for item_level in item_levels])
+    step_time = np.array([profile.step_time(item_level) for item_level in item_levels])
+
+    # (item, target, protect, candidate)
+    cost = (enhance_cost[:, None, None, None] * steps[..., None] + protect_price[:, None, None, :] * protects[..., None]
+            + (steps * step_time[:, None, None] * profile.time_value)[..., None])
+    target = np.arange(levels)[:, None]
+    protect = np.arange(levels)[None, :]
+    allowed = (protect >= np.minimum(2, target)) & (protect <= target)
+    cost = np.where(allowed[None, :, :, None] & ~padding[:, None, None, :], cost, np.inf)
+    best = cost.reshape(len(item_hrids), levels, -1).argmin(axis=2)
+    best_protect, best_candidate = np.divmod(best, width)
+
+    strategies = []
+    for row, item_hrid in enumerate(item_hrids):
+        for target_level in range(1, levels):
+            protect_level = int(best_protect[row, target_level])
+            candidate = int(best_candidate[row, target_level])
+            used = protects[row, target_level, protect_level] > 0
+            strategies.append(Strategy(
+                item_hrid, target_level, protect_level, candidates[row][candidate] if used else None,
+                float(cost[row, target_level, protect_level, candidate]), float(steps[row, target_level, protect_level]),
+                float(protects[row, target_level, protect_level]), float(exp[row, target_level, protect_level])))
+    return strategies
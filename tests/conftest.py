@@ -0,0 +1,28 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# item.py reads e2c.json relative to the working directory
+os.chdir(ROOT)
+
+from benchmarks.make_fixtures import MARKET_FIXTURE  # noqa: E402
+from market import Market  # noqa: E402
+
+
+@pytest.fixture
+def fixture_market():
+    """
+    Offline Market over the checked-in benchmark marketplace.
+    """
+    with open(MARKET_FIXTURE, encoding='utf-8') as f:
+        data = json.load(f)
+    market = Market(url=None, snapshot_path=None)
+    market.verbose = False
+    market.load_market_data(data)
+    market.last_update_time = time.time()
+    return market
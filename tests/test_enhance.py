@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import enhance
+from benchmarks.cost_cdf import max_cdf_error
+
+
+@pytest.mark.parametrize('method', ['CF', 'CFnum'])
+def test_lattice_pmf_cache_keeps_damped_and_undamped_apart(method):
+    # the first call damps its pmf and cuts it to half the FFT length, the second needs the undamped one of the same length
+    act = enhance.Action(6, 3, 0.0129, 0.1, 1, 2)
+    act.cost_cdf(1024, method=method)
+    xs, ys = act.cost_cdf(3994, method=method)
+    fresh_xs, fresh_ys = enhance.Action(6, 3, 0.0129, 0.1, 1, 2).cost_cdf(3994, method=method)
+    assert np.array_equal(xs, fresh_xs) and np.array_equal(ys, fresh_ys)
+    # the lattice pmf is renormalized, DP with a tight tol is 7e-9 short of 1 at the end of the support
+    reference = enhance.Action(6, 3, 0.0129, 0.1, 1, 2).cost_cdf(3994, tol=1e-16, method='DP')
+    assert max_cdf_error(reference, (xs, ys)) < 1e-8
+
+
+def shared_range_error(reference, result):
+    """
+    max_cdf_error over the costs both CDFs cover, DP reaches one attempt further than the lattice methods.
+    """
+    end = min(reference[0][-1], result[0][-1])
+    return max_cdf_error(tuple(part[reference[0] <= end] for part in reference), tuple(part[result[0] <= end] for part in result))
+
+
+@pytest.mark.parametrize('method', ['CF', 'CFnum'])
+@pytest.mark.parametrize('args, steps', [
+    ((3, 2, 0.0129, 0.1, 1, 5), 200),
+    ((5, 3, 0.0129, 0.1, 2, 7), 400),
+    ((6, 3, 0.0, 0.05, 3, 1), 500),
+    ((8, 5, 0.0129, 0.1, 1, 100), 2000),
+])
+def test_characteristic_function_matches_dp(method, args, steps):
+    # a tight DP tol, its pruning at the default tol alone is worth ~1e-8
+    reference = enhance.Action(*args).cost_cdf(steps, tol=1e-16, method='DP')
+    assert shared_range_error(reference, enhance.Action(*args).cost_cdf(steps, method=method)) < 1e-9
@@ -0,0 +1,107 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import game_data
+import init_client_data
+
+
+@pytest.fixture(scope='module')
+def parsed():
+    return game_data.load(snapshot_dir=None)
+
+
+def assert_same_game_data(expected, actual):
+    assert actual.game_version == expected.game_version
+    assert actual.client_data == expected.client_data
+    assert (actual.item_hrids, actual.house_hrids, actual.action_hrids) == (expected.item_hrids, expected.house_hrids, expected.action_hrids)
+    assert sorted(actual.tables) == sorted(expected.tables)
+    for name, table in expected.tables.items():
+        assert actual.tables[name].dtype == table.dtype, name
+        np.testing.assert_array_equal(actual.tables[name], table, err_msg=name)
+    assert actual.shop_offers == expected.shop_offers
+    assert actual.ability_books == expected.ability_books
+    assert actual.house_costs == expected.house_costs
+
+
+def test_snapshot_round_trip(tmp_path, parsed):
+    written = game_data.load(snapshot_dir=str(tmp_path))
+    path = game_data.snapshot_path(parsed.game_version, str(tmp_path))
+    assert path.endswith(f'{parsed.game_version}-format{game_data.SNAPSHOT_FORMAT}')
+    with open(os.path.join(path, 'client_data.pickle'), 'rb') as f:
+        assert pickle.load(f)['format'] == game_data.SNAPSHOT_FORMAT
+    assert sorted(os.listdir(path)) == sorted(['client_data.pickle'] + [f'{name}.npy' for name in parsed.tables])
+    assert_same_game_data(parsed, written)
+
+    opened = game_data.load(snapshot_dir=str(tmp_path))
+    assert all(isinstance(table, np.memmap) for table in opened.tables.values())
+    assert_same_game_data(parsed, opened)
+
+
+def test_snapshot_keyed_on_game_version(tmp_path, parsed):
+    with open(game_data.INIT_CLIENT_DATA_PATH, encoding='utf-8') as f:
+        text = f.read()
+    bumped = tmp_path / 'init_client_data.json'
+    bumped.write_text(text.replace(f'"gameVersion": "{parsed.game_version}"', '"gameVersion": "v-bumped"', 1), encoding='utf-8')
+    snapshot_dir = tmp_path / 'snapshots'
+    game_data.load(snapshot_dir=str(snapshot_dir))
+
+    reloaded = game_data.load(str(bumped), snapshot_dir=str(snapshot_dir))
+    assert reloaded.game_version == 'v-bumped'
+    assert sorted(os.listdir(snapshot_dir)) == sorted(os.path.basename(game_data.snapshot_path(version))
+                                                      for version in (parsed.game_version, 'v-bumped'))
+    assert game_data.load(str(bumped), snapshot_dir=str(snapshot_dir)).game_version == 'v-bumped'
+
+
+def test_snapshot_of_another_format_is_ignored(tmp_path, parsed):
+    game_data.load(snapshot_dir=str(tmp_path))
+    path = game_data.snapshot_path(parsed.game_version, str(tmp_path))
+    with open(os.path.join(path, 'client_data.pickle'), 'rb') as f:
+        snapshot = pickle.load(f)
+    snapshot['format'] = game_data.SNAPSHOT_FORMAT - 1
+    with open(os.path.join(path, 'client_data.pickle'), 'wb') as f:
+        pickle.dump(snapshot, f)
+    with pytest.raises(ValueError):
+        game_data.GameData.open(path)
+    assert_same_game_data(parsed, game_data.load(snapshot_dir=str(tmp_path)))
+
+
+def test_init_client_data_is_loaded_lazily(monkeypatch, parsed):
+    monkeypatch.delitem(vars(init_client_data), 'INIT_CLIENT_DATA', raising=False)
+    assert 'INIT_CLIENT_DATA' not in vars(init_client_data)
+    data = init_client_data.INIT_CLIENT_DATA
+    assert data['gameVersion'] == parsed.game_version
+    assert set(game_data.CLIENT_DATA_KEYS) <= set(data)
+    assert vars(init_client_data)['INIT_CLIENT_DATA'] is data
+    assert init_client_data.INIT_CLIENT_DATA is data
+    with pytest.raises(AttributeError):
+        init_client_data.NOT_THERE
+
+
+def test_reverse_indexes_match_client_data(parsed):
+    client_data = parsed.client_data
+    shop_offers = {}
+    for detail in client_data['shopItemDetailMap'].values():
+        cost = detail['costs'][0]
+        shop_offers.setdefault(cost['itemHrid'], set()).add((detail['itemHrid'], cost['count']))
+    assert {currency: set(offers) for currency, offers in parsed.shop_offers.items()} == shop_offers
+
+    ability_books = {}
+    for item_hrid, item_detail in client_data['itemDetailMap'].items():
+        book = item_detail.get('abilityBookDetail')
+        if book:
+            ability_books.setdefault(book['abilityHrid'], set()).add((item_hrid, book['experienceGain']))
+    assert {ability: set(books) for ability, books in parsed.ability_books.items()} == ability_books
+
+    assert sorted(parsed.house_costs) == sorted(client_data['houseRoomDetailMap'])
+    for house_hrid, house in client_data['houseRoomDetailMap'].items():
+        levels = parsed.house_costs[house_hrid]
+        assert len(levels) == 1 + max(int(level) for level in house['upgradeCostsMap'])
+        for level, costs in enumerate(levels):
+            expected = {}
+            for upgrade in range(1, level + 1):
+                for cost in house['upgradeCostsMap'][str(upgrade)]:
+                    expected[cost['itemHrid']] = expected.get(cost['itemHrid'], 0) + cost['count']
+            assert costs == expected
@@ -0,0 +1,140 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import history
+import item as item_module
+from benchmarks.make_fixtures import MARKET_FIXTURE
+from history import MarketHistory
+from item import Item
+from market import Market
+
+SIZE = len(item_module.ITEM_HRIDS) * item_module.ENHANCE_LEVELS
+
+
+def random_snapshots(count, seed=0):
+    """
+    count market_prices dicts, each a few entries away from the previous one : moved, listed and delisted prices.
+    """
+    rng = np.random.default_rng(seed)
+    market_prices = {mode: np.full(SIZE, -1, dtype=np.int64) for mode in history.MODES}
+    snapshots = []
+    for _ in range(count):
+        market_prices = {mode: prices.copy() for mode, prices in market_prices.items()}
+        for prices in market_prices.values():
+            nodes = rng.choice(SIZE, 50, replace=False)
+            prices[nodes] = np.where(rng.random(50) < 0.2, -1, rng.integers(1, 10 ** 12, 50))
+        snapshots.append(market_prices)
+    return snapshots
+
+
+def assert_same_market_prices(actual, expected):
+    assert sorted(actual) == sorted(expected)
+    for mode in expected:
+        np.testing.assert_array_equal(actual[mode], expected[mode])
+
+
+def test_append_and_prices_at(tmp_path):
+    snapshots = random_snapshots(10)
+    store = MarketHistory(str(tmp_path), keyframe_interval=4)
+    for k, market_prices in enumerate(snapshots):
+        assert store.append(1000 + 10 * k, market_prices)
+    assert not store.append(1090, snapshots[0])
+    assert len(store) == 10
+    np.testing.assert_array_equal(store.column('keyframes'), [1, 0, 0, 0, 1, 0, 0, 0, 1, 0])
+
+    # a fresh reader decodes keyframes and deltas from disk, in any order
+    reader = MarketHistory(str(tmp_path))
+    assert reader.keyframe_interval == 4
+    for k in (9, 0, 5, 6, 3, 8, 7):
+        for timestamp in (1000 + 10 * k, 1000 + 10 * k + 9):
+            assert_same_market_prices(reader.prices_at(timestamp)[1], snapshots[k])
+            assert reader.prices_at(timestamp)[0] == 1000 + 10 * k
+    with pytest.raises(KeyError):
+        reader.prices_at(999)
+    for (timestamp, market_prices), k in zip(reader.snapshots(1015, 1060), range(2, 7)):
+        assert timestamp == 1000 + 10 * k
+        assert_same_market_prices(market_prices, snapshots[k])
+
+    items = [Item(item_module.ITEM_HRIDS[0]), Item(item_module.ITEM_HRIDS[-1], 3)]
+    times, prices = reader.series(items, 'b')
+    np.testing.assert_array_equal(times, 1000 + 10 * np.arange(10))
+    np.testing.assert_array_equal(prices, [[snapshot['b'][it.index * item_module.ENHANCE_LEVELS + it.enhance_level] for it in items]
+                                           for snapshot in snapshots])
+
+
+def test_torn_append_is_cut_back(tmp_path):
+    snapshots = random_snapshots(4)
+    store = MarketHistory(str(tmp_path), keyframe_interval=3)
+    for k, market_prices in enumerate(snapshots[:3]):
+        store.append(1000 + k, market_prices)
+    sizes = {name: os.path.getsize(store.path(name)) for name in ('ends', 'keyframes', 'keys', 'values')}
+    # an append interrupted before its timestamp was written
+    for name, data in (('keys', [1, 2, 3]), ('values', [7, 8]), ('ends', [10 ** 9])):
+        with open(store.path(name), 'ab') as f:
+            f.write(np.asarray(data, dtype=history.COLUMNS[name]).tobytes())
+
+    reopened = MarketHistory(str(tmp_path))
+    assert len(reopened) == 3
+    assert {name: os.path.getsize(reopened.path(name)) for name in sizes} == sizes
+    assert_same_market_prices(reopened.prices_at(1002)[1], snapshots[2])
+    assert reopened.append(1003, snapshots[3])
+    assert_same_market_prices(MarketHistory(str(tmp_path)).prices_at(1003)[1], snapshots[3])
+
+
+def test_other_format_is_refused(tmp_path):
+    MarketHistory(str(tmp_path))
+    meta_path = tmp_path / 'meta.json'
+    meta = json.loads(meta_path.read_text(encoding='utf-8'))
+    meta['format'] = history.HISTORY_FORMAT + 1
+    meta_path.write_text(json.dumps(meta), encoding='utf-8')
+    with pytest.raises(ValueError):
+        MarketHistory(str(tmp_path))
+
+
+def recorded_market(tmp_path, **options):
+    """
+    Offline Market with a history of three fixture payloads, 600 seconds apart with moving prices.
+    """
+    with open(MARKET_FIXTURE, encoding='utf-8') as f:
+        data = json.load(f)
+    market = Market(url=None, snapshot_path=None, history=MarketHistory(str(tmp_path)), **options)
+    market.verbose = False
+    payloads = []
+    for k in range(3):
+        data = json.loads(json.dumps(data))
+        data['marketData']['/items/milk']['0'] = {'a': 10 + k, 'b': 5 + k}
+        data['timestamp'] += 600
+        market.load_market_data(data)
+        payloads.append(data)
+    return market, payloads
+
+
+def test_market_at_and_price_history(tmp_path):
+    market, payloads = recorded_market(tmp_path, enhance_item_mode='force')
+    items = [Item('/items/milk'), Item('/items/holy_sword', 5)]
+    times, prices = market.price_history(items, 'a')
+    assert times.tolist() == [data['timestamp'] for data in payloads]
+    for row, data in zip(prices, payloads):
+        expected = Market(url=None, snapshot_path=None, enhance_item_mode='force')
+        expected.verbose = False
+        expected.load_market_data(data)
+        assert row.tolist() == [expected.get_price(it, 'a') for it in items]
+        past = market.at(data['timestamp'] + 1)
+        assert past.market_data_time == data['timestamp']
+        assert [past.get_price(it, 'a') for it in items] == row.tolist()
+        # the offline copies share the graph structure of the market, only their values are their own
+        assert past.price_graph.dependencies is market.price_graph.dependencies
+        assert past.price_graph.values is not market.price_graph.values
+
+
+def test_price_history_beyond_int64(tmp_path):
+    market, payloads = recorded_market(tmp_path, default_price_a=2 ** 70)
+    unlisted = next(Item(item_hrid) for item_hrid in item_module.ITEM_HRIDS
+                    if item_hrid not in payloads[0]['marketData'] and market.get_price(Item(item_hrid), 'a') == 2 ** 70)
+    times, prices = market.price_history([Item('/items/milk'), unlisted], 'a')
+    assert prices.dtype == object
+    assert prices.tolist() == [[10 + k, 2 ** 70] for k in range(3)]
+    assert market.price_history([Item('/items/milk')], 'a')[1].dtype == np.int64
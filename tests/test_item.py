@@ -0,0 +1,29 @@
+import pickle
+
+import item as item_module
+from item import Item
+
+
+def test_items_are_interned():
+    milk = Item('/items/milk')
+    assert Item('/items/milk') is milk
+    assert Item('/items/milk', 0) is milk
+    assert Item('/items/holy_sword', 5) is Item('/items/holy_sword', 5)
+    assert Item('/items/holy_sword', 5) is not Item('/items/holy_sword', 6)
+    assert Item._pool['/items/milk', 0] is milk
+
+
+def test_pickle_keeps_identity():
+    items = [Item('/items/milk'), Item('/items/holy_sword', 5), Item('/items/holy_sword', 5)]
+    loaded = pickle.loads(pickle.dumps(items))
+    assert all(a is b for a, b in zip(loaded, items))
+    assert pickle.loads(pickle.dumps(Item('/items/cheese', 3), protocol=0)) is Item('/items/cheese', 3)
+
+
+def test_from_node_round_trip():
+    for it in (Item('/items/coin'), Item('/items/milk'), Item('/items/holy_sword', 5),
+               Item(item_module.ITEM_HRIDS[-1], item_module.ENHANCE_LEVELS - 1)):
+        assert item_module.from_node(it.node) is it
+    catalog = item_module.catalog()
+    assert len(catalog) == len(item_module.ITEM_HRIDS) * item_module.ENHANCE_LEVELS
+    assert all(it.node == node for node, it in enumerate(catalog))
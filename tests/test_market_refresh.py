@@ -0,0 +1,131 @@
+import http.server
+import json
+import threading
+
+import pytest
+
+from item import Item
+from market import Market
+
+TIMESTAMP = 1_750_000_000
+
+
+def payload(timestamp=TIMESTAMP, price=10):
+    return {'marketData': {'/items/milk': {'0': {'a': price, 'b': price - 1}}}, 'timestamp': timestamp}
+
+
+class StandInServer(http.server.ThreadingHTTPServer):
+    """
+    Local stand-in for the marketplace API : serves `body` with `etag`, answers 304 to a matching If-None-Match.
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.body = json.dumps(payload())
+        self.etag = '"1"'
+        self.status = 200
+        self.requests = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/market.json'
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.status != 200:
+            self.send_response(server.status)
+            self.end_headers()
+            return
+        if server.etag is not None and self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = server.body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if server.etag is not None:
+            self.send_header('ETag', server.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_market(server, tmp_path, **kwargs):
+    market = Market(url=server.url, snapshot_path=str(tmp_path / 'snapshot.json'), timeout=5, **kwargs)
+    market.verbose = False
+    return market
+
+
+def test_etag_revalidation_keeps_data(server, tmp_path):
+    market = make_market(server, tmp_path)
+    assert market.etag == '"1"'
+    assert market.get_price(Item('/items/milk'), 'a') == 10
+    market.refresh_market_data()
+    assert server.requests[-1]['If-None-Match'] == '"1"'
+    assert market.market_data_time == TIMESTAMP
+    assert market.get_price(Item('/items/milk'), 'a') == 10
+
+
+def test_unchanged_timestamp_is_skipped(server, tmp_path):
+    server.etag = None
+    market = make_market(server, tmp_path)
+    assert market.fetch_market_data(server.url) is None
+    server.body = json.dumps(payload(TIMESTAMP + 600, price=20))
+    market.refresh_market_data()
+    assert market.get_price(Item('/items/milk'), 'a') == 20
+
+
+@pytest.mark.parametrize('failure', ['status', 'malformed', 'partial'])
+def test_snapshot_fallback(server, tmp_path, failure):
+    make_market(server, tmp_path)
+    server.etag = None
+    if failure == 'status':
+        server.status = 500
+    elif failure == 'malformed':
+        server.body = '{"marketData": '
+    else:
+        server.body = json.dumps({'marketData': {}})
+    market = make_market(server, tmp_path)
+    assert market.market_data_time == TIMESTAMP
+    assert market.get_price(Item('/items/milk'), 'a') == 10
+    # a failing auto refresh keeps the data instead of raising out of get_price
+    market.last_update_time = 0
+    assert market.get_price(Item('/items/milk'), 'a') == 10
+
+
+def test_failure_without_snapshot_raises(server, tmp_path):
+    server.body = json.dumps({'marketData': {}})
+    with pytest.raises(KeyError):
+        make_market(server, tmp_path)
+
+
+def test_background_refresh_stops(server, tmp_path):
+    make_market(server, tmp_path)
+    server.body = json.dumps(payload(TIMESTAMP + 600, price=30))
+    server.etag = '"2"'
+    market = make_market(server, tmp_path, background_refresh=True, refresh_interval=0.05)
+    thread = market.refresh_thread
+    assert thread.is_alive()
+    for _ in range(100):
+        if market.market_data_time == TIMESTAMP + 600:
+            break
+        thread.join(0.05)
+    assert market.get_price(Item('/items/milk'), 'a') == 30
+    market.stop_refresh()
+    assert market.refresh_thread is None and not thread.is_alive()
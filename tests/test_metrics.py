@@ -0,0 +1,43 @@
+from item import Item
+
+ITEMS = [Item('/items/milk'), Item('/items/holy_sword'), Item('/items/holy_sword', 10), Item('/items/chimerical_chest'), Item('/items/cheese')]
+
+
+def test_cache_hits_count_top_level_lookups_only(fixture_market):
+    market_metrics = fixture_market.enable_metrics()
+    fixture_market.price_vector('b')
+    for it in ITEMS:
+        fixture_market.get_price(it, 'b')
+    counters = market_metrics.stats()['counters']
+    assert counters.get('price_cache_hit') == len(ITEMS)
+    assert 'price_cache_miss' not in counters
+
+
+def test_cache_miss_then_hit(fixture_market):
+    market_metrics = fixture_market.enable_metrics()
+    fixture_market.get_price(Item('/items/holy_sword', 10), 'a')
+    fixture_market.get_price(Item('/items/holy_sword', 10), 'a')
+    counters = market_metrics.stats()['counters']
+    assert counters.get('price_cache_miss') == 1 and counters.get('price_cache_hit') == 1
+    fixture_market.disable_metrics()
+    assert 'resolve' not in fixture_market.price_graph.__dict__
+
+
+def test_resolve_records_nodes_and_depth(fixture_market):
+    market_metrics = fixture_market.enable_metrics()
+    node = Item('/items/task_crystal').node
+    dependencies = fixture_market.price_graph.dependencies
+    closure, stack = {node}, [node]
+    while stack:
+        for dep in dependencies[stack.pop()]:
+            if dep not in closure:
+                closure.add(dep)
+                stack.append(dep)
+
+    def chain(n):
+        return 1 + max((chain(dep) for dep in dependencies[n]), default=0)
+
+    fixture_market.get_price(Item('/items/task_crystal'), 'a')
+    histograms = market_metrics.stats()['histograms']
+    assert histograms['resolve_nodes']['sum'] == len(closure)
+    assert histograms['resolve_depth']['sum'] == chain(node) > 2
@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+import tools
+from benchmarks.make_fixtures import INVENTORY_SIZES, player_fixture
+
+
+def load_player(inventory_size):
+    with open(player_fixture(inventory_size), encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('inventory_size', INVENTORY_SIZES)
+def test_networth_batch_matches_get_player_networth(fixture_market, inventory_size):
+    player = load_player(inventory_size)
+    expected = tools.get_player_networth(fixture_market, player)
+    batch = tools.networth_batch(fixture_market, [player, player])
+    for category in tools.NETWORTH_CATEGORIES:
+        for mode in ('a', 'b'):
+            assert [int(value) for value in batch[category][mode]] == [expected[category][mode]] * 2
+
+
+def test_networth_batch_does_not_wrap(fixture_market):
+    # the 10k inventory is worth more than int64 holds in mode 'a' with the default prices
+    player = load_player(10_000)
+    batch = tools.networth_batch(fixture_market, [player])
+    assert tools.get_player_networth(fixture_market, player)['inventory_networth']['a'] > 2 ** 63
+    assert batch['inventory_networth']['a'][0] > 2 ** 63
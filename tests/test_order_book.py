@@ -0,0 +1,87 @@
+import json
+
+import numpy as np
+import pytest
+
+import item as item_module
+import tools
+from benchmarks.make_fixtures import ORDER_BOOK_FIXTURE, player_fixture
+from order_book import OrderBooks
+
+BOOKS = {
+    '/items/milk': [{'asks': [{'price': 12, 'quantity': 5}],
+                     'bids': [{'price': 8, 'quantity': 10}, {'price': 10, 'quantity': 3}, {'price': 9, 'quantity': 0}]}],
+    '/items/cheese': [None, {'bids': [{'price': 100, 'quantity': 2}]}],
+}
+
+
+def node(item_hrid, enhance_level=0):
+    return item_module.ITEM_INDEX[item_hrid] * item_module.ENHANCE_LEVELS + enhance_level
+
+
+def walk(levels, count, beyond_depth):
+    value = 0
+    for price, quantity in sorted(levels, reverse=True):
+        value += min(count, quantity) * price
+        count -= min(count, quantity)
+    return value + (count * min(levels)[0] if beyond_depth == 'last' and levels else 0)
+
+
+@pytest.fixture(scope='module')
+def fixture_books():
+    return OrderBooks.load(ORDER_BOOK_FIXTURE)
+
+
+@pytest.mark.parametrize('beyond_depth', ['last', 'zero'])
+def test_value_walks_the_bids(beyond_depth):
+    books = OrderBooks(BOOKS)
+    fallback = np.full(len(item_module.ITEM_HRIDS) * item_module.ENHANCE_LEVELS, 7, dtype=np.int64)
+    nodes = [node('/items/milk')] * 5 + [node('/items/cheese', 1), node('/items/cheese'), node('/items/egg')]
+    counts = [0, 2, 3, 13, 20, 5, 4, 6]
+    milk = [(10, 3), (8, 10)]
+    expected = [walk(milk, count, beyond_depth) for count in counts[:5]] + [walk([(100, 2)], 5, beyond_depth), 28, 42]
+    assert books.value(nodes, counts, fallback, beyond_depth).tolist() == expected
+    assert books.depth(nodes[:1] + nodes[5:]).tolist() == [13, 2, 0, 0]
+
+
+def test_value_does_not_wrap():
+    price = 2 ** 62
+    books = OrderBooks({'/items/milk': [{'bids': [{'price': price, 'quantity': 3}, {'price': price - 1, 'quantity': 3}]}]})
+    fallback = np.zeros(len(item_module.ITEM_HRIDS) * item_module.ENHANCE_LEVELS, dtype=np.int64)
+    assert books.value([node('/items/milk')], [10], fallback, 'last')[0] == 3 * price + 7 * (price - 1)
+    assert books.value([node('/items/milk')], [10], fallback)[0] == 3 * price + 3 * (price - 1)
+
+
+def test_liquidation_never_exceeds_top_of_book(fixture_market, fixture_books):
+    with open(player_fixture(10_000), encoding='utf-8') as f:
+        player = json.load(f)
+    plain = tools.get_player_networth(fixture_market, player)
+    liquidation = tools.get_player_networth(fixture_market, player, order_books=fixture_books)
+    batch = tools.networth_batch(fixture_market, [player], order_books=fixture_books)
+    for category in tools.NETWORTH_CATEGORIES:
+        for mode in ('a', 'b'):
+            assert 0 <= liquidation[category][mode] <= plain[category][mode]
+            assert int(batch[category][mode][0]) == liquidation[category][mode]
+    assert liquidation['inventory_networth']['b'] < plain['inventory_networth']['b']
+
+
+def test_holdings_larger_than_the_book(fixture_market):
+    books = OrderBooks(BOOKS)
+    player = {'characterAbilities': [], 'characterHouseRoomMap': {},
+              'characterItems': [{'itemHrid': '/items/milk', 'enhancementLevel': 0, 'count': 20},
+                                 {'itemHrid': '/items/egg', 'enhancementLevel': 0, 'count': 4}],
+              'myMarketListings': [{'isSell': True, 'itemHrid': '/items/milk', 'enhancementLevel': 0,
+                                    'orderQuantity': 6, 'filledQuantity': 1, 'price': 9}]}
+    milk = [(10, 3), (8, 10)]
+    egg = {mode: 4 * fixture_market.get_price(item_module.Item('/items/egg'), mode) for mode in ('a', 'b')}
+    # 25 milk against 13 in the bids, split 20 : 5 between inventory and the listing
+    for beyond_depth, kwargs in (('zero', {}), ('zero', {'beyond_depth': 'zero'}), ('last', {'beyond_depth': 'last'})):
+        value = walk(milk, 25, beyond_depth)
+        networth = tools.get_player_networth(fixture_market, player, order_books=books, **kwargs)
+        batch = tools.networth_batch(fixture_market, [player], order_books=books, **kwargs)
+        for mode in ('a', 'b'):
+            assert networth['inventory_networth'][mode] == value * 20 // 25 + egg[mode]
+            assert networth['market_networth'][mode] == value - value * 20 // 25
+            assert int(batch['inventory_networth'][mode][0]) == networth['inventory_networth'][mode]
+            assert int(batch['market_networth'][mode][0]) == networth['market_networth'][mode]
+    assert walk(milk, 25, 'zero') == 110 < walk(milk, 25, 'last')
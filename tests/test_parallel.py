@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import item as item_module
+from parallel import SharedPrices
+
+
+class ConstantMarket:
+    def __init__(self, price):
+        self.price = price
+
+    def price_vector(self, mode):
+        return np.full((len(item_module.ITEM_HRIDS), item_module.ENHANCE_LEVELS), self.price if mode == 'a' else -self.price, dtype=np.int64)
+
+
+def test_view_reads_both_modes_from_one_generation():
+    prices = SharedPrices()
+    try:
+        prices.publish(ConstantMarket(1))
+        view = prices.view()
+        prices.publish(ConstantMarket(2))
+        assert view.price_vector('a')[0, 0] == 1 and view.price_vector('b')[0, 0] == -1
+        assert not view.stale()
+        assert prices.view().price_vector('b')[0, 0] == -2
+    finally:
+        prices.close()
+
+
+def test_run_retries_when_its_generation_is_overwritten():
+    prices = SharedPrices()
+    try:
+        prices.publish(ConstantMarket(1))
+        seen = []
+
+        def job(view):
+            a = int(view.price_vector('a')[0, 0])
+            if not seen:
+                prices.publish(ConstantMarket(2))
+                prices.publish(ConstantMarket(3))
+            b = int(view.price_vector('b')[0, 0])
+            seen.append((a, b))
+            return a, b
+
+        assert prices.run(job) == (3, -3)
+        assert seen == [(1, -3), (3, -3)]
+    finally:
+        prices.close()
+
+
+def test_publish_refuses_prices_beyond_int64():
+    prices = SharedPrices()
+    try:
+        prices.publish(ConstantMarket(1))
+        market = ConstantMarket(1)
+        market.price_vector = lambda mode: np.full((len(item_module.ITEM_HRIDS), item_module.ENHANCE_LEVELS), 2 ** 63, dtype=object)
+        with pytest.raises(OverflowError, match='int64'):
+            prices.publish(market)
+        assert prices.generation == 1 and int(prices.header[0]) == 1
+        assert prices.view().price_vector('a')[0, 0] == 1
+    finally:
+        prices.close()
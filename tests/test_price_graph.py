@@ -0,0 +1,62 @@
+import copy
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.make_fixtures import MARKET_FIXTURE
+from market import Market
+
+OPTION_SETS = [{}, {'enhance_item_mode': 'force', 'cowbell_price': True, 'back_slot_price': True}]
+
+
+def fixture_data():
+    with open(MARKET_FIXTURE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def changed_data(data):
+    """
+    The fixture payload one refresh later : a few prices moved, one listing gone, one new.
+    """
+    data = copy.deepcopy(data)
+    market_data = data['marketData']
+    for item_hrid in ('/items/milk', '/items/cheese', '/items/holy_sword', '/items/bag_of_10_cowbells', '/items/task_token'):
+        if item_hrid in market_data:
+            market_data[item_hrid]['0'] = {'a': market_data[item_hrid]['0']['a'] * 2 + 1, 'b': market_data[item_hrid]['0']['b'] + 3}
+    market_data.pop('/items/egg', None)
+    market_data.setdefault('/items/holy_sword', {})['5'] = {'a': 123_456_789, 'b': 98_765_432}
+    data['timestamp'] += 600
+    return data
+
+
+def offline_market(data, **options):
+    market = Market(url=None, snapshot_path=None, **options)
+    market.verbose = False
+    market.load_market_data(data)
+    return market
+
+
+def assert_same_prices(market, expected):
+    for mode in ('a', 'b'):
+        assert np.array_equal(market.price_vector(mode), expected.price_vector(mode))
+
+
+@pytest.mark.parametrize('options', OPTION_SETS)
+def test_incremental_refresh_matches_fresh_market(options):
+    data = fixture_data()
+    market = offline_market(data, **options)
+    for mode in ('a', 'b'):
+        market.price_vector(mode)
+    changed = changed_data(data)
+    market.load_market_data(changed)
+    assert_same_prices(market, offline_market(changed, **options))
+
+
+def test_changed_options_rebuild_the_graph():
+    data = fixture_data()
+    market = offline_market(data)
+    for mode in ('a', 'b'):
+        market.price_vector(mode)
+    market.enhance_item_mode, market.cowbell_price, market.back_slot_price = 'force', True, True
+    assert_same_prices(market, offline_market(data, **OPTION_SETS[1]))
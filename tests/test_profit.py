@@ -0,0 +1,42 @@
+import json
+
+import numpy as np
+
+from benchmarks.make_fixtures import MARKET_FIXTURE
+from market import Market
+from profit import MODES, ProfitScanner
+
+
+def moved_data(data):
+    """
+    The payload one refresh later : a few input and output prices moved, one listing gone.
+    """
+    data = json.loads(json.dumps(data))
+    market_data = data['marketData']
+    for item_hrid in ('/items/milk', '/items/cheese', '/items/log', '/items/cotton'):
+        if item_hrid in market_data:
+            market_data[item_hrid]['0'] = {'a': market_data[item_hrid]['0']['a'] * 2 + 1, 'b': market_data[item_hrid]['0']['b'] + 3}
+    market_data.pop('/items/egg', None)
+    data['timestamp'] += 600
+    return data
+
+
+def test_refresh_matches_full_scan(fixture_market):
+    scanner = ProfitScanner(fixture_market, speed=0.1, efficiency={'/action_types/cheesesmithing': 0.2})
+    scanner.scan()
+    before = {mode: scanner.profit[mode].copy() for mode in MODES}
+    rankings = {mode: scanner.ranking(mode) for mode in MODES}
+
+    with open(MARKET_FIXTURE, encoding='utf-8') as f:
+        fixture_market.load_market_data(moved_data(json.load(f)))
+    affected = scanner.refresh()
+
+    fresh = ProfitScanner(fixture_market, speed=0.1, efficiency={'/action_types/cheesesmithing': 0.2})
+    fresh.scan()
+    for mode in MODES:
+        assert np.array_equal(scanner.profit[mode], fresh.profit[mode])
+        changed = np.flatnonzero(before[mode] != fresh.profit[mode])
+        assert len(changed) and set(changed.tolist()) <= set(affected[mode].tolist())
+        assert scanner.ranking(mode) != rankings[mode]
+        assert scanner.ranking(mode) == fresh.ranking(mode)
+    assert all(len(indices) == 0 for indices in scanner.refresh().values())
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import enhance
+from simulate import MonteCarlo
+
+
+def exact_moments(act, rewards):
+    """
+    Mean and variance of the total reward from +0 to the target, rewards[i, j] earned on each i -> j attempt.
+    """
+    transitions = act.P[:-1, :]
+    mean = act.N @ (transitions * rewards[:-1, :]).sum(axis=1)
+    second = act.N @ ((transitions * rewards[:-1, :] ** 2).sum(axis=1) + 2 * (act.Q * rewards[:-1, :-1]) @ mean)
+    return mean[0], second[0] - mean[0] ** 2
+
+
+def assert_within_standard_errors(sample, mean, variance, errors=5):
+    n = len(sample)
+    assert abs(sample.mean() - mean) < errors * np.sqrt(variance / n)
+    # standard error of the sample variance, from the sample's fourth central moment
+    fourth = ((sample - sample.mean()) ** 4).mean()
+    assert abs(sample.var(ddof=1) - variance) < errors * np.sqrt((fourth - variance ** 2) / n)
+
+
+@pytest.mark.parametrize('block_steps', [8, 128])
+@pytest.mark.parametrize('args', [(5, 3, 0.0129, 0.1, 3, 40), (8, 5, 0.0, 0.05, 1, 200)])
+def test_sampled_moments_match_action(args, block_steps):
+    act = enhance.Action(*args)
+    mc = MonteCarlo(act, seed=7, batch_size=50_000, block_steps=block_steps)
+    mc.run(batches=2)
+    assert len(mc) == 100_000
+
+    steps_mean, steps_variance = exact_moments(act, np.ones_like(act.H))
+    cost_mean, cost_variance = exact_moments(act, act.H)
+    assert steps_mean == pytest.approx(act.expected_steps) and cost_mean == pytest.approx(act.expected_cost)
+    assert_within_standard_errors(mc.steps.astype(np.float64), steps_mean, steps_variance)
+    assert_within_standard_errors(mc.costs().astype(np.float64), cost_mean, cost_variance)
+    assert abs(mc.protects.mean() - act.expected_protect) < 5 * mc.protects.std() / np.sqrt(len(mc)) + 1e-12
@@ -0,0 +1,31 @@
+import pytest
+
+import enhance
+from game_data import GAME_DATA
+from item import Item
+from strategy import optimize
+
+ITEM_HRIDS = ['/items/cheese_sword', '/items/cheese_brush', '/items/holy_sword', '/items/celestial_enhancer']
+
+
+@pytest.mark.parametrize('mode', ['a', 'b'])
+def test_optimize_matches_get_enhanced_price(fixture_market, mode):
+    fixture_market.enhance_item_mode = 'force'
+    strategies = optimize(fixture_market, mode, fixture_market.bonus_profile, item_hrids=ITEM_HRIDS)
+    assert [(s.item_hrid, s.target_level) for s in strategies] == [
+        (item_hrid, target_level) for item_hrid in ITEM_HRIDS for target_level in range(1, enhance.MAX_LEVEL + 1)]
+    for s in strategies:
+        item_detail = GAME_DATA.client_data['itemDetailMap'][s.item_hrid]
+        table = fixture_market.bonus_profile.expectation_table(item_detail['itemLevel'])
+        assert (s.steps, s.protects, s.exp) == tuple(float(column[s.target_level, s.protect_level]) for column in table)
+        assert min(2, s.target_level) <= s.protect_level <= s.target_level
+        assert (s.protection_item_hrid is None) == (s.protects == 0)
+
+        base_price = fixture_market.get_price(Item(s.item_hrid), mode)
+        enhanced_price = fixture_market.get_enhanced_price(Item(s.item_hrid, s.target_level), mode)
+        if len(item_detail.get('protectionItemHrids') or []) <= 1:
+            # the same candidates and the same objective as get_enhanced_price
+            assert int(s.expected_cost) + base_price == enhanced_price
+        else:
+            # get_enhanced_price only considers the first protectionItemHrids entry
+            assert int(s.expected_cost) + base_price <= enhanced_price
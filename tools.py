@@ -1,14 +1,16 @@
 import json
 import pprint
 
+import numpy as np
+
 import market
 import item
 from item import Item
-from init_client_data import INIT_CLIENT_DATA
+from game_data import GAME_DATA
 
 
 def get_house_price(market: market.Market, house_hrid, level, mode):
-    house_room_detail = INIT_CLIENT_DATA['houseRoomDetailMap'][house_hrid]
+    house_room_detail = GAME_DATA.client_data['houseRoomDetailMap'][house_hrid]
     upgrade_cost = house_room_detail['upgradeCostsMap'][str(level)]
     return sum(
         market.get_price(Item(cost['itemHrid']), mode) * cost['count']
@@ -16,32 +18,53 @@ def get_house_price(market: market.Market, house_hrid, level, mode):
     )
 
 
-def get_player_networth(market: market.Market, data):
+def get_house_networth(market: market.Market, house_hrid, level, mode):
+    """
+    Total cost of upgrading a house room from nothing to `level`.
+    """
+    return sum(
+        market.get_price(Item(item_hrid), mode) * count
+        for item_hrid, count in GAME_DATA.house_costs[house_hrid][level].items()
+    )
+
+
+def get_player_networth(market: market.Market, data, order_books=None, beyond_depth='zero'):
+    """
+    With order_books (order_book.OrderBooks), inventory and sell listings are valued at what selling them into the bids
+    would raise instead of count * top-of-book. That value is the same in both modes : a liquidation only ever meets
+    the bids, so the mode only picks the market price used for items without bids. Units beyond the depth of the
+    bids are worth nothing unless beyond_depth='last' (see OrderBooks.value).
+    """
     ability_networth = {'a': 0, 'b': 0}
     for ability in data['characterAbilities']:
-        ability_hrid = ability['abilityHrid']
-        for item_hrid, item_detail in INIT_CLIENT_DATA['itemDetailMap'].items():
-            if item_detail.get('abilityBookDetail', {}).get('abilityHrid', '') != ability_hrid:
-                continue
+        for item_hrid, experience_gain in GAME_DATA.ability_books.get(ability['abilityHrid'], []):
             it = item.Item(item_hrid)
             price_a = market.get_price(it, mode='a')
-            ability_networth['a'] += price_a * (ability['experience'] / item_detail['abilityBookDetail']['experienceGain'] + 1)
+            ability_networth['a'] += price_a * (ability['experience'] / experience_gain + 1)
 
             price_b = market.get_price(it, mode='b')
-            ability_networth['b'] += price_b * (ability['experience'] / item_detail['abilityBookDetail']['experienceGain'] + 1)
+            ability_networth['b'] += price_b * (ability['experience'] / experience_gain + 1)
     ability_networth['a'] = int(ability_networth['a'])
     ability_networth['b'] = int(ability_networth['b'])
 
     inventory_networth = {'a': 0, 'b': 0}
-    for inventory_item in data['characterItems']:
-        inventory_networth['a'] += (market.get_price(item.Item(inventory_item['itemHrid'], inventory_item['enhancementLevel']), mode='a')
-                                    * inventory_item['count'])
-        inventory_networth['b'] += (market.get_price(item.Item(inventory_item['itemHrid'], inventory_item['enhancementLevel']), mode='b')
-                                    * inventory_item['count'])
-
     market_networth = {'a': 0, 'b': 0}
+    if order_books is not None:
+        liquidation = liquidation_networth(market, order_books, *holdings([data]), players=1, beyond_depth=beyond_depth)
+        for mode, (inventory_values, listing_values) in liquidation.items():
+            inventory_networth[mode] = int(inventory_values[0])
+            market_networth[mode] = int(listing_values[0])
+    else:
+        for inventory_item in data['characterItems']:
+            inventory_networth['a'] += (market.get_price(item.Item(inventory_item['itemHrid'], inventory_item['enhancementLevel']), mode='a')
+                                        * inventory_item['count'])
+            inventory_networth['b'] += (market.get_price(item.Item(inventory_item['itemHrid'], inventory_item['enhancementLevel']), mode='b')
+                                        * inventory_item['count'])
+
     for listing in data['myMarketListings']:
         if listing['isSell']:
+            if order_books is not None:
+                continue
             market_networth['a'] += (market.get_price(Item(listing['itemHrid'], listing['enhancementLevel']), mode='a') *
                                      (listing['orderQuantity'] - listing['filledQuantity']))
             market_networth['b'] += (market.get_price(Item(listing['itemHrid'], listing['enhancementLevel']), mode='b') *
@@ -52,8 +75,8 @@ def get_player_networth(market: market.Market, data):
 
     house_networth = {'a': 0, 'b': 0}
     for house_hrid, detail in data['characterHouseRoomMap'].items():
-        house_networth['a'] += sum(get_house_price(market, house_hrid, level, 'a') for level in range(1, detail['level'] + 1))
-        house_networth['b'] += sum(get_house_price(market, house_hrid, level, 'b') for level in range(1, detail['level'] + 1))
+        house_networth['a'] += get_house_networth(market, house_hrid, detail['level'], 'a')
+        house_networth['b'] += get_house_networth(market, house_hrid, detail['level'], 'b')
 
     return {
         'ability_networth': ability_networth,
@@ -63,6 +86,148 @@ def get_player_networth(market: market.Market, data):
     }
 
 
+def holdings(players):
+    """
+    Sellable holdings of player exports as flat arrays : player, node, inventory count, sell listing count.
+    """
+    players_, nodes, inventory_counts, listing_counts = [], [], [], []
+    for player, data in enumerate(players):
+        for inventory_item in data['characterItems']:
+            players_.append(player)
+            nodes.append(item.ITEM_INDEX[inventory_item['itemHrid']] * item.ENHANCE_LEVELS + inventory_item['enhancementLevel'])
+            inventory_counts.append(inventory_item['count'])
+            listing_counts.append(0)
+        for listing in data['myMarketListings']:
+            if listing['isSell']:
+                players_.append(player)
+                nodes.append(item.ITEM_INDEX[listing['itemHrid']] * item.ENHANCE_LEVELS + listing['enhancementLevel'])
+                inventory_counts.append(0)
+                listing_counts.append(listing['orderQuantity'] - listing['filledQuantity'])
+    return (np.array(players_, dtype=np.int64), np.array(nodes, dtype=np.int64),
+            np.array(inventory_counts, dtype=np.int64), np.array(listing_counts, dtype=np.int64))
+
+
+def liquidation_networth(market: market.Market, order_books, player_index, nodes, inventory_counts, listing_counts, players,
+                         beyond_depth='zero'):
+    """
+    Holdings (as returned by holdings()) valued against the order book depth, identically in both modes except for the
+    positions without bids, which fall back to the mode's price vector.
+    Inventory and listings of the same item and enhance level are one position, walked through the book once so it does
+    not take the top of the book twice, and its value is split between the two pro rata by count.
+    Returns {mode: (inventory value per player, listing value per player)}, int64 or exact object arrays like sum_at.
+    """
+    size = len(item.ITEM_HRIDS) * item.ENHANCE_LEVELS
+    positions, inverse = np.unique(player_index * size + nodes, return_inverse=True)
+    inventory = np.zeros(len(positions), dtype=np.int64)
+    listed = np.zeros(len(positions), dtype=np.int64)
+    np.add.at(inventory, inverse, inventory_counts)
+    np.add.at(listed, inverse, listing_counts)
+    total = np.maximum(inventory + listed, 1)
+    result = {}
+    for mode in ('a', 'b'):
+        values = order_books.value(positions % size, inventory + listed, market.price_vector(mode).ravel(), beyond_depth)
+        if values.dtype != object and np.abs(values.astype(np.float64) * inventory).max(initial=0) >= 2 ** 62:
+            values = values.astype(object)
+        if values.dtype == object:
+            inventory_values = values * inventory.astype(object) // total.astype(object)
+        else:
+            inventory_values = values * inventory // total
+        result[mode] = (sum_at(players, positions // size, inventory_values), sum_at(players, positions // size, values - inventory_values))
+    return result
+
+
+def sum_at(length, index, values):
+    """
+    np.add.at into a new array of length, in int64 unless the sums could leave its range, then in exact Python ints.
+    """
+    estimate = np.zeros(length)
+    np.add.at(estimate, index, np.abs(values.astype(np.float64)))
+    dtype = object if values.dtype == object or estimate.max(initial=0) >= 2 ** 62 else np.int64
+    totals = np.zeros(length, dtype=dtype)
+    np.add.at(totals, index, values.astype(dtype))
+    return totals
+
+
+NETWORTH_CATEGORIES = ('ability_networth', 'inventory_networth', 'market_networth', 'house_networth')
+
+
+def networth_batch(market: market.Market, players, order_books=None, beyond_depth='zero'):
+    """
+    get_player_networth for many player exports in one pass.
+    Holdings of every player are gathered into sparse (player x category, item x enhance level) count matrices
+    and priced against the a/b price vectors together, or against the order book depth for inventory and sell listings
+    when order_books is given.
+    Returns {category: {'a': int64 array, 'b': int64 array}}, one entry per player. When some total could leave the
+    int64 range the arrays are object arrays of exact Python ints instead, like the sums of get_player_networth.
+    """
+    prices = np.stack([market.price_vector('a').ravel(), market.price_vector('b').ravel()], axis=1)
+    ability, inventory, listing_category, house = range(len(NETWORTH_CATEGORIES))
+    rows, nodes, counts = [], [], []
+    ability_rows, ability_nodes, ability_counts = [], [], []
+    cash = np.zeros(len(players) * len(NETWORTH_CATEGORIES), dtype=np.int64)
+    for player, data in enumerate(players):
+        row = player * len(NETWORTH_CATEGORIES)
+        for character_ability in data['characterAbilities']:
+            for item_hrid, experience_gain in GAME_DATA.ability_books.get(character_ability['abilityHrid'], []):
+                ability_rows.append(row + ability)
+                ability_nodes.append(item.ITEM_INDEX[item_hrid] * item.ENHANCE_LEVELS)
+                ability_counts.append(character_ability['experience'] / experience_gain + 1)
+        if order_books is None:
+            for inventory_item in data['characterItems']:
+                rows.append(row + inventory)
+                nodes.append(item.ITEM_INDEX[inventory_item['itemHrid']] * item.ENHANCE_LEVELS + inventory_item['enhancementLevel'])
+                counts.append(inventory_item['count'])
+        for listing in data['myMarketListings']:
+            quantity = listing['orderQuantity'] - listing['filledQuantity']
+            if listing['isSell']:
+                if order_books is not None:
+                    continue
+                rows.append(row + listing_category)
+                nodes.append(item.ITEM_INDEX[listing['itemHrid']] * item.ENHANCE_LEVELS + listing['enhancementLevel'])
+                counts.append(quantity)
+            else:
+                cash[row + listing_category] += quantity * listing['price']
+        for house_hrid, detail in data['characterHouseRoomMap'].items():
+            for item_hrid, count in GAME_DATA.house_costs[house_hrid][detail['level']].items():
+                rows.append(row + house)
+                nodes.append(item.ITEM_INDEX[item_hrid] * item.ENHANCE_LEVELS)
+                counts.append(count)
+
+    rows = np.array(rows, dtype=np.intp)
+    counts = np.array(counts, dtype=np.int64)[:, np.newaxis]
+    item_prices = prices[np.array(nodes, dtype=np.intp)]
+    # fractional book counts are summed as floats and truncated per category, like get_player_networth
+    ability_totals = np.zeros((len(cash), 2))
+    np.add.at(ability_totals, np.array(ability_rows, dtype=np.intp),
+              np.array(ability_counts, dtype=float)[:, np.newaxis] * prices[np.array(ability_nodes, dtype=np.intp)].astype(np.float64))
+    liquidation = {}
+    if order_books is not None:
+        liquidation = liquidation_networth(market, order_books, *holdings(players), players=len(players), beyond_depth=beyond_depth)
+    # int64 sums wrap silently : a float64 estimate of every sum decides whether they are taken in Python ints instead
+    estimate = np.abs(cash).astype(np.float64)[:, np.newaxis] + np.abs(ability_totals)
+    np.add.at(estimate, rows, np.abs(counts * item_prices.astype(np.float64)))
+    for column, mode in enumerate(liquidation):
+        estimate[inventory::len(NETWORTH_CATEGORIES), column] += np.abs(liquidation[mode][0].astype(np.float64))
+        estimate[listing_category::len(NETWORTH_CATEGORIES), column] += np.abs(liquidation[mode][1].astype(np.float64))
+    exact = prices.dtype == object or any(values.dtype == object for mode in liquidation for values in liquidation[mode])
+    if not exact and estimate.max(initial=0) < 2 ** 62:
+        totals = np.repeat(cash[:, np.newaxis], 2, axis=1)
+        np.add.at(totals, rows, counts * item_prices)
+        totals += ability_totals.astype(np.int64)
+    else:
+        totals = np.repeat(cash.astype(object)[:, np.newaxis], 2, axis=1)
+        np.add.at(totals, rows, counts.astype(object) * item_prices.astype(object))
+        totals += np.vectorize(int, otypes=[object])(ability_totals)
+    totals = totals.reshape(len(players), len(NETWORTH_CATEGORIES), 2)
+    for column, mode in enumerate(liquidation):
+        totals[:, inventory, column] += liquidation[mode][0].astype(totals.dtype)
+        totals[:, listing_category, column] += liquidation[mode][1].astype(totals.dtype)
+    return {
+        category: {'a': totals[:, index, 0], 'b': totals[:, index, 1]}
+        for index, category in enumerate(NETWORTH_CATEGORIES)
+    }
+
+
 if __name__ == '__main__':
     market = market.Market(enhance_item_mode='force')
     with open('AlphB.json', 'r', encoding='utf-8') as f: